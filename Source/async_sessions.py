@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from exercises import CHOICES, RepCounter
+from kinematics import NUM_LANDMARKS, fill_landmarks, joint_angles
+from sessions import parse_source
+from smoothing import LandmarkFilter
+
+# kind is "phase" (exercise entered a new phase), "rep" (a rep was counted) or "complete" (target reached)
+RepEvent = namedtuple("RepEvent", ["session", "kind", "exercise", "reps", "phase", "timestamp"])
+
+
+async def read_frames(cap, executor=None, frame_interval=0.0):
+    """Async iterator over (img, captured_at) from an open cv2.VideoCapture.
+
+    Each blocking cap.read() runs in the executor. With frame_interval set,
+    frames are paced at that interval, as for a recorded video played live.
+    """
+    loop = asyncio.get_running_loop()
+    next_frame = time.perf_counter()
+    while True:
+        if frame_interval:
+            next_frame += frame_interval
+            await asyncio.sleep(max(next_frame - time.perf_counter(), 0))
+        success, img = await loop.run_in_executor(executor, cap.read)
+        if not success:
+            return
+        yield img, time.perf_counter()
+
+
+def _process(pose, img):
+    return pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+
+
+async def infer(pose, img, executor=None):
+    """Run pose.process on a BGR frame in the executor and return the results."""
+    return await asyncio.get_running_loop().run_in_executor(executor, _process, pose, img)
+
+
+def rep_events(session, counter, counted, previous_phase, timestamp):
+    """Return the RepEvents of one RepCounter.update() of person 0, given its counted mask and the phases before."""
+    events = []
+    names = counter.table.names
+    for e in range(len(names)):
+        if counter.phase[0, e] != previous_phase[e]:
+            events.append(RepEvent(session, "phase", names[e], int(counter.reps[0, e]), counter.phase_name(0, e),
+                                   timestamp))
+        if counted[0, e]:
+            events.append(RepEvent(session, "rep", names[e], int(counter.reps[0, e]), counter.phase_name(0, e),
+                                   timestamp))
+    return events
+
+
+class AsyncSession:
+    """One station as a stream of RepEvents, for many sessions on one event loop.
+
+    A reader task keeps only the newest frame, like pipeline.LatestQueue, so a
+    slow inference never works through a backlog of stale frames. Inference
+    runs in the shared executor; counting happens on the event loop.
+    """
+
+    def __init__(self, session_id, source, exercise_names, pose=None, target_reps=None, executor=None,
+                 smooth=False):
+        self.session_id = session_id
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video source {source}")
+        if pose is None:
+            import mediapipe as mp
+            pose = mp.solutions.pose.Pose()
+        self.pose = pose
+        self.target_reps = target_reps
+        self.executor = executor
+        self.smoother = LandmarkFilter() if smooth else None
+        self.counter = RepCounter(exercise_names)
+        self.landmarks = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)  # Refilled every frame
+
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if not isinstance(source, int) else 0
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.dropped = 0
+        self.running = False
+
+    def reps(self):
+        return dict(zip(self.counter.table.names, self.counter.reps[0].tolist()))
+
+    def stop(self):
+        self.running = False
+
+    async def _read(self, frames):
+        try:
+            async for frame in read_frames(self.cap, self.executor, self.frame_interval):
+                if not self.running:
+                    break
+                if frames.full():
+                    frames.get_nowait()  # Drop the oldest frame
+                    self.dropped += 1
+                frames.put_nowait(frame)
+        finally:
+            if frames.full():
+                frames.get_nowait()
+            frames.put_nowait(None)  # End of stream
+
+    async def events(self):
+        """Async iterator of RepEvents until the source ends, the target is reached or stop() is called."""
+        self.running = True
+        frames = asyncio.Queue(maxsize=1)
+        reader = asyncio.create_task(self._read(frames))
+        try:
+            while self.running:
+                frame = await frames.get()
+                if frame is None:
+                    break
+                img, captured_at = frame
+                results = await infer(self.pose, img, self.executor)
+                fill_landmarks(self.landmarks, results)
+                landmarks = self.landmarks
+                if self.smoother is not None:
+                    landmarks = self.smoother.filter(landmarks, captured_at)
+                previous_phase = self.counter.phase[0].copy()
+                counted = self.counter.update(joint_angles(landmarks))
+                for event in rep_events(self.session_id, self.counter, counted, previous_phase, captured_at):
+                    yield event
+
+                if self.target_reps and (self.counter.reps >= self.target_reps).all():
+                    yield RepEvent(self.session_id, "complete", None, self.target_reps, None, captured_at)
+                    break
+        finally:
+            self.running = False
+            await reader  # Returns after the read in progress, so the capture is not released under it
+            self.cap.release()
+
+
+async def merge_events(sessions):
+    """Async iterator over the RepEvents of all sessions, in the order they happen."""
+    merged = asyncio.Queue()
+
+    async def forward(session):
+        try:
+            async for event in session.events():
+                await merged.put(event)
+        except Exception as e:
+            print(f"Error in session {session.session_id}: {e}")
+        await merged.put(None)
+
+    tasks = [asyncio.create_task(forward(session)) for session in sessions]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            event = await merged.get()
+            if event is None:
+                remaining -= 1
+            else:
+                yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_sessions(sources, exercise_names, target_reps=None, workers=None, smooth=False):
+    """Count reps for every source on one event loop and print each event as a JSON line."""
+    with ThreadPoolExecutor(workers) as executor:
+        sessions = [AsyncSession(i, source, exercise_names, target_reps=target_reps, executor=executor,
+                                 smooth=smooth)
+                    for i, source in enumerate(sources)]
+        async for event in merge_events(sessions):
+            print(json.dumps(event._asdict()), flush=True)
+        return sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream rep events for several cameras or videos on one event loop.")
+    parser.add_argument("sources", nargs="+", help="Camera indices or video files/URLs, one per station")
+    parser.add_argument("--choice", type=int, choices=[1, 2, 3, 4], default=1,
+                        help="1: right arm curls, 2: left arm curls, 3: both arms curls, 4: squats")
+    parser.add_argument("--reps", type=int, default=None, help="End each session once this many reps are done")
+    parser.add_argument("--workers", type=int, default=None, help="Inference worker threads (default: all cores)")
+    parser.add_argument("--smooth", action="store_true",
+                        help="Smooth the landmarks over time so jitter near a threshold cannot double count")
+    args = parser.parse_args()
+
+    try:
+        sessions = asyncio.run(run_sessions([parse_source(source) for source in args.sources],
+                                            CHOICES[args.choice], args.reps, args.workers,
+                                            args.smooth))
+    except KeyboardInterrupt:
+        return
+    for session in sessions:
+        print(f"Session {session.session_id} ({session.source}): reps {session.reps()}, "
+              f"{session.dropped} frames dropped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from exercises import EXERCISES, count_reps
+from kinematics import JOINT_NAMES, joint_angles, landmark_array
+from landmark_trace import save_trace
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+# One MediaPipe Pose instance per worker process, created by init_worker
+_pose = None
+
+
+def init_worker():
+    global _pose
+    cv2.setNumThreads(1)  # The pool already uses every core
+    _pose = mp.solutions.pose.Pose()
+
+
+def find_videos(input_dir):
+    return sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if name.lower().endswith(VIDEO_EXTENSIONS)
+    )
+
+
+def video_info(path):
+    """Return (frame_count, fps) of a video, raising IOError if it cannot be opened."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file {path}")
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    return frame_count, fps
+
+
+def make_tasks(paths, segment_frames=0):
+    """Split the videos into (path, start, stop) shards, whole files unless segment_frames is set."""
+    shards = []
+    for path in paths:
+        try:
+            frame_count, _ = video_info(path)
+        except IOError as e:
+            print(f"Error: {e}")
+            continue
+        if segment_frames <= 0 or frame_count <= 0:
+            shards.append((frame_count, (path, 0, None)))
+            continue
+        for start in range(0, frame_count, segment_frames):
+            stop = min(start + segment_frames, frame_count)
+            shards.append((stop - start, (path, start, stop)))
+
+    # Longest shards first so the pool does not end up waiting on one big file
+    shards.sort(key=lambda shard: -shard[0])
+    return [task for _, task in shards]
+
+
+def process_segment(task):
+    """Run pose estimation over one shard and return (path, start, stop, landmarks, error).
+
+    A shard that cannot be read or processed comes back with landmarks None
+    and the error as text instead of raising, so one bad file or shard does
+    not abort the batch and lose the shards already done.
+    """
+    path, start, stop = task
+    try:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video file {path}")
+        try:
+            if start:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            if hasattr(_pose, "reset"):
+                _pose.reset()  # Do not carry tracking over from the previous shard
+
+            frames = []
+            index = start
+            while stop is None or index < stop:
+                success, img = cap.read()
+                if not success:
+                    break
+                results = _pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+                frames.append(landmark_array(results))
+                index += 1
+        finally:
+            cap.release()
+    except Exception as e:
+        return path, start, stop, None, f"{type(e).__name__}: {e}"
+
+    if not frames:
+        return path, start, stop, np.empty((0, 33, 4), dtype=np.float32), None
+    return path, start, stop, np.stack(frames), None
+
+
+def join_segments(segments):
+    """Put the (start, stop, landmarks, error) shards of one video back in order.
+
+    Returns (landmarks, failed) with failed the shards that came back with an
+    error. Their frames are NaN, as frames without a pose, so the frames after
+    them keep their index and time; a failed whole-file shard has no frames.
+    """
+    parts, failed = [], []
+    for start, stop, landmarks, error in sorted(segments, key=lambda segment: segment[0]):
+        if error is not None:
+            failed.append({"start": start, "stop": stop, "error": error})
+            landmarks = np.full((stop - start if stop is not None else 0, 33, 4), np.nan, dtype=np.float32)
+        parts.append(landmarks)
+    return np.concatenate(parts), failed
+
+
+def summarize(path, landmarks, fps, failed=()):
+    """Return the per-video rep counts and per-frame angles, and the shards that failed, if any."""
+    angles = joint_angles(landmarks)
+    summary = {
+        "video": path,
+        "frames": len(landmarks),
+        "fps": fps,
+        "detected_frames": int(np.count_nonzero(~np.isnan(landmarks[:, 0, 0]))),
+        "reps": count_reps(angles, list(EXERCISES)),
+        "failed_segments": list(failed),
+    }
+    return summary, angles
+
+
+def write_results(output_dir, summary, angles, landmarks=None):
+    """Write the summary JSON and angle CSV, plus a landmark trace if landmarks are given."""
+    name = os.path.splitext(os.path.basename(summary["video"]))[0]
+    if landmarks is not None:
+        save_trace(os.path.join(output_dir, f"{name}.trace"), landmarks,
+                   np.arange(len(landmarks)) / summary["fps"])
+    with open(os.path.join(output_dir, f"{name}.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    with open(os.path.join(output_dir, f"{name}_angles.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["frame", "time"] + JOINT_NAMES)
+        for frame, row in enumerate(angles):
+            writer.writerow([frame, f"{frame / summary['fps']:.3f}"] + [f"{angle:.2f}" for angle in row])
+
+
+def process_directory(input_dir, output_dir, workers=None, segment_frames=0, save_traces=False):
+    """Process every video in input_dir on a process pool and write one result set per video."""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = find_videos(input_dir)
+    tasks = make_tasks(paths, segment_frames)
+
+    # Collect the shards of each video and write it out once all of them are back
+    remaining = {}
+    for path, _, _ in tasks:
+        remaining[path] = remaining.get(path, 0) + 1
+    segments = {path: [] for path in remaining}
+
+    summaries = []
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+        for path, start, stop, landmarks, error in pool.imap_unordered(process_segment, tasks):
+            segments[path].append((start, stop, landmarks, error))
+            if error is not None:
+                print(f"Error in {os.path.basename(path)} frames {start}-{'end' if stop is None else stop}: {error}")
+            remaining[path] -= 1
+            if remaining[path]:
+                continue
+
+            landmarks, failed = join_segments(segments.pop(path))
+            try:
+                fps = video_info(path)[1]
+            except IOError:
+                fps = 30.0  # Unreadable by now; its shards failed too, as they are listed in the summary
+            summary, angles = summarize(path, landmarks, fps, failed)
+            write_results(output_dir, summary, angles, landmarks if save_traces else None)
+            summaries.append(summary)
+            print(f"{os.path.basename(path)}: {summary['frames']} frames, reps {summary['reps']}"
+                  + (f", {len(failed)} failed segments" if failed else ""))
+
+    elapsed = time.perf_counter() - start_time
+    total_frames = sum(summary["frames"] for summary in summaries)
+    if elapsed > 0:
+        print(f"Processed {len(summaries)} videos, {total_frames} frames in {elapsed:.1f}s "
+              f"({total_frames / elapsed:.1f} frames/s)")
+    incomplete = [summary["video"] for summary in summaries if summary["failed_segments"]]
+    if incomplete:
+        print(f"{len(incomplete)} videos with failed segments: {', '.join(map(os.path.basename, incomplete))}")
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count reps in a directory of recorded workout videos.")
+    parser.add_argument("input_dir", help="Directory with the recorded videos")
+    parser.add_argument("output_dir", help="Directory for the per-video JSON and angle CSV files")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--segment-frames", type=int, default=0,
+                        help="Split videos into shards of this many frames (default: one shard per video)")
+    parser.add_argument("--save-traces", action="store_true",
+                        help="Also save the landmarks of each video as a trace file for landmark_trace.py")
+    args = parser.parse_args()
+    process_directory(args.input_dir, args.output_dir, args.workers, args.segment_frames, args.save_traces)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import kinematics
+from exercises import CHOICES, RepCounter, count_reps
+from frame_ring import FrameRing
+from kinematics import joint_angles
+from landmark_trace import ReplayResults
+from render import TextOverlay
+from rep_quality import RepAnalyzer
+from smoothing import LandmarkFilter
+from streams import Detector
+from synthetic import synthetic_trace, write_synthetic_video
+
+BENCHMARK_VERSION = 2
+
+
+def load_mediapipe():
+    """Return mp.solutions if MediaPipe (with the solutions API) is installed, else None."""
+    try:
+        import mediapipe as mp
+        return mp.solutions
+    except (ImportError, AttributeError):
+        return None
+
+
+def load_qimage():
+    try:
+        from PyQt5.QtGui import QImage
+        return QImage
+    except ImportError:
+        return None
+
+
+def timings(durations):
+    """Summarize per-item durations in seconds as machine-readable stats."""
+    durations = np.asarray(durations) * 1000
+    total = durations.sum()
+    return {
+        "count": int(len(durations)),
+        "mean_ms": float(durations.mean()),
+        "p50_ms": float(np.percentile(durations, 50)),
+        "p95_ms": float(np.percentile(durations, 95)),
+        "fps": float(len(durations) / total * 1000) if total > 0 else None,
+    }
+
+
+def time_each(fn, items):
+    """Call fn on every item and return the list of durations."""
+    durations = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def read_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    durations = []
+    while True:
+        start = time.perf_counter()
+        success, img = cap.read()
+        if not success:
+            break
+        durations.append(time.perf_counter() - start)
+        frames.append(img)
+    cap.release()
+    return frames, durations
+
+
+def run_benchmark(frames=300, width=640, height=480, reps=5):
+    """Time each stage of the pose pipeline on synthetic input and return the results as a dict."""
+    solutions = load_mediapipe()
+    QImage = load_qimage()
+    fps = 30.0
+    period = frames / fps / reps
+
+    results = {
+        "benchmark_version": BENCHMARK_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "frames": frames,
+        "resolution": [width, height],
+        "inference": "mediapipe" if solutions else "replay",
+        "stages": {},
+        "end_to_end": {},
+        "skipped": [],
+    }
+    stages = results["stages"]
+
+    # The detectors print every rep; keep that out of the JSON output
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        traces = {choice: synthetic_trace(choice, reps=reps, fps=fps, period=period)[0][:frames]
+                  for choice in CHOICES}
+        # One video per choice, so each exercise is timed end to end on footage of itself
+        videos = {}
+        for choice, trace in traces.items():
+            videos[choice] = os.path.join(tmp, f"synthetic_choice{choice}.avi")
+            write_synthetic_video(videos[choice], trace, fps, width, height)
+
+        images, durations = read_frames(videos[3])
+        stages["decode"] = timings(durations)
+        stages["cvtColor"] = timings(time_each(lambda img: cv2.cvtColor(img, cv2.COLOR_BGR2RGB), images))
+
+        mpPose = solutions.pose if solutions else kinematics
+        if solutions:
+            pose = solutions.pose.Pose()
+            rgb = [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in images]
+            stages["pose.process"] = timings(time_each(pose.process, rgb))
+            pose_results = [pose.process(img) for img in rgb]
+            drawable = [(img.copy(), r) for img, r in zip(images, pose_results) if r.pose_landmarks]
+            if drawable:
+                stages["draw_landmarks"] = timings(time_each(
+                    lambda item: solutions.drawing_utils.draw_landmarks(
+                        item[0], item[1].pose_landmarks, solutions.pose.POSE_CONNECTIONS), drawable))
+        else:
+            results["skipped"] += ["pose.process", "draw_landmarks"]
+
+        for choice, trace in traces.items():
+            replayed = [ReplayResults(frame) for frame in trace]
+            detector = Detector(choice, reps)
+            stages[f"detect_choice_{choice}"] = timings(
+                time_each(lambda r: detector.update(None, r, kinematics), replayed))
+        landmarks = np.empty((kinematics.NUM_LANDMARKS, 4), dtype=np.float32)
+        stages["fill_landmarks"] = timings(time_each(lambda r: kinematics.fill_landmarks(landmarks, r),
+                                                     [ReplayResults(frame) for frame in traces[3]]))
+
+        landmark_filter = LandmarkFilter()
+        stages["smoothing"] = timings(time_each(
+            lambda item: landmark_filter.filter(item[1], item[0] / fps), enumerate(traces[3])))
+
+        counter = RepCounter(["squats"])
+        analyzer = RepAnalyzer(["squats"])
+        squat_angles = joint_angles(traces[4])
+        stages["rep_quality"] = timings(time_each(
+            lambda item: analyzer.update(item[1], counter.update(item[1])[0], item[0] / fps),
+            enumerate(squat_angles)))
+
+        all_traces = np.concatenate(list(traces.values()))
+        start = time.perf_counter()
+        angles = joint_angles(all_traces)
+        count_reps(angles, ["right_curls", "left_curls", "squats"])
+        elapsed = time.perf_counter() - start
+        stages["vectorized_angles_and_counts"] = {
+            "count": len(all_traces),
+            "total_ms": elapsed * 1000,
+            "fps": len(all_traces) / elapsed if elapsed > 0 else None,
+        }
+
+        lines = [f"Right Reps: {i // 60}/{reps}" for i in range(len(images))]
+        stages["put_text"] = timings(time_each(
+            lambda item: cv2.putText(item[0], item[1], (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2,
+                                     cv2.LINE_AA), zip(images, lines)))
+        overlay = TextOverlay()
+        stages["text_overlay"] = timings(time_each(lambda item: overlay.draw(item[0], [item[1]]),
+                                                   zip(images, lines)))
+
+        # The GUI's display path: scale into a preallocated ring slot, then wrap the slot without a copy
+        bgr_supported = QImage is not None and hasattr(QImage, "Format_BGR888")
+        ring = FrameRing(swap_rb=not bgr_supported)
+        ring.set_target_size(width, height)
+
+        def display(img):
+            slot = ring.acquire()
+            frame = ring.write(slot, img)
+            ring.publish(slot)
+            if QImage:
+                QImage(frame.data, frame.shape[1], frame.shape[0], frame.strides[0],
+                       QImage.Format_BGR888 if bgr_supported else QImage.Format_RGB888)
+            ring.release(slot)
+
+        stages["frame_ring" if QImage else "frame_ring_write"] = timings(time_each(display, images))
+        if not QImage:
+            results["skipped"].append("frame_ring")
+
+        # End to end: decode, inference, drawing, detection and overlay text for each menu choice
+        for choice, trace in traces.items():
+            cap = cv2.VideoCapture(videos[choice])
+            detector = Detector(choice, reps)
+            durations = []
+            for frame in trace:
+                start = time.perf_counter()
+                success, img = cap.read()
+                if not success:
+                    break
+                imageRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+                if solutions:
+                    pose_result = pose.process(imageRGB)
+                    if pose_result.pose_landmarks:
+                        solutions.drawing_utils.draw_landmarks(
+                            img, pose_result.pose_landmarks, solutions.pose.POSE_CONNECTIONS)
+                else:
+                    pose_result = ReplayResults(frame)
+                detector.update(img, pose_result, mpPose)
+                cv2.putText(img, detector.text(), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                durations.append(time.perf_counter() - start)
+            cap.release()
+            results["end_to_end"][f"choice_{choice}"] = timings(durations)
+
+    return results
+
+
+def compare(baseline, current):
+    """Print the change in mean time per stage between two benchmark results."""
+    for section in ("stages", "end_to_end"):
+        for name, stats in current[section].items():
+            before = baseline.get(section, {}).get(name)
+            if not before or "mean_ms" not in stats or "mean_ms" not in before:
+                continue
+            change = (stats["mean_ms"] - before["mean_ms"]) / before["mean_ms"] * 100
+            print(f"{name:32} {before['mean_ms']:9.3f} ms -> {stats['mean_ms']:9.3f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pose pipeline stages on synthetic input.")
+    parser.add_argument("--frames", type=int, default=300, help="Frames of synthetic video per run")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare against an earlier JSON result file")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.frames, args.width, args.height)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from event_server import (OP_BINARY, OP_CLOSE, OP_PING, OP_PONG, OP_TEXT, EventServer, RepPublisher,
+                          decode_binary, decode_rows, read_frame)
+from exercises import CHOICES
+from landmark_trace import TRACE_DTYPE, load_trace
+from synthetic import synthetic_trace
+
+
+def encode_client_frame(opcode, payload):
+    """Encode one masked (client to server) WebSocket frame."""
+    mask = os.urandom(4)
+    masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return struct.pack("!BB", 0x80 | opcode, 0x80 | len(payload)) + mask + masked
+
+
+class EventClient:
+    """Subscribe to one session of an EventServer and decode its updates."""
+
+    def __init__(self, host, port, session, binary=False):
+        self.host = host
+        self.port = port
+        self.session = str(session)
+        self.binary = binary
+        self.joints = None
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16))
+        query = "?format=binary" if self.binary else ""
+        self.writer.write(f"GET /sessions/{self.session}{query} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                          f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Version: 13\r\n"
+                          f"Sec-WebSocket-Key: {key.decode()}\r\n\r\n".encode())
+        response = await self.reader.readuntil(b"\r\n\r\n")
+        if not response.startswith(b"HTTP/1.1 101"):
+            raise ConnectionError(f"WebSocket handshake failed: {response.splitlines()[0].decode()}")
+        _, hello = await read_frame(self.reader)
+        self.joints = json.loads(hello)["joints"]
+        return self
+
+    async def messages(self):
+        """Async iterator of updates: dicts with timestamps and (frames, joints) angles, or events.
+
+        Every update has "sent_at" (server time.time()), "received_at" and
+        "bytes" (the WebSocket payload size).
+        """
+        while True:
+            try:
+                opcode, payload = await read_frame(self.reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            received_at = time.time()
+            if opcode == OP_CLOSE:
+                return
+            if opcode == OP_PING:
+                self.writer.write(encode_client_frame(OP_PONG, payload))
+                continue
+            if opcode == OP_BINARY:
+                timestamps, angles, sent_at = decode_binary(payload)
+                message = {"sent_at": sent_at, "timestamps": timestamps, "angles": angles, "events": []}
+            elif opcode == OP_TEXT:
+                message = json.loads(payload)
+                if "angles" in message:
+                    message["angles"] = decode_rows(message["angles"])
+            else:
+                continue
+            message["received_at"] = received_at
+            message["bytes"] = len(payload)
+            yield message
+
+    async def close(self):
+        try:
+            self.writer.write(encode_client_frame(OP_CLOSE, struct.pack("!H", 1000)))
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+        self.writer.close()
+
+
+def replay_into(publisher, trace, speed=1.0, stopped=None):
+    """Publish the frames of a trace at their recorded pace divided by speed (0: as fast as possible)."""
+    start = time.perf_counter()
+    for timestamp, landmarks in zip(trace["timestamp"], trace["landmarks"]):
+        if stopped is not None and stopped.is_set():
+            return
+        if speed > 0:
+            time.sleep(max(start + timestamp / speed - time.perf_counter(), 0))
+        publisher.write_array(landmarks, start + timestamp / (speed or 1))
+
+
+async def measure(client, stats):
+    await client.connect()
+    async for message in client.messages():
+        stats["messages"] += 1
+        stats["bytes"] += message["bytes"]
+        stats["frames"] += len(message.get("timestamps", []))
+        stats["events"] += len(message.get("events", []))
+        stats["latencies"].append(message["received_at"] - message["sent_at"])
+
+
+async def load_test(traces, exercise_names, subscribers, binary, speed, batch_interval):
+    server = EventServer(0, batch_interval=batch_interval)
+    stats = [{"messages": 0, "bytes": 0, "frames": 0, "events": 0, "latencies": []}
+             for _ in range(len(traces) * subscribers)]
+    clients = [EventClient(server.host, server.port, i // subscribers, binary) for i in range(len(stats))]
+    tasks = [asyncio.create_task(measure(client, client_stats)) for client, client_stats in zip(clients, stats)]
+    while server.subscriber_count() < len(clients):
+        await asyncio.sleep(0.01)
+
+    stopped = threading.Event()
+    publishers = [RepPublisher(server, i, exercise_names) for i in range(len(traces))]
+    threads = [threading.Thread(target=replay_into, args=(publisher, trace, speed, stopped), daemon=True)
+               for publisher, trace in zip(publishers, traces)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(batch_interval * 3)  # Let the last batch reach every subscriber
+    finally:
+        stopped.set()
+    elapsed = time.perf_counter() - start
+
+    for client in clients:
+        await client.close()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    server.stop()
+
+    latencies = np.array([latency for client_stats in stats for latency in client_stats["latencies"]]) * 1000
+    published = sum(publisher.frames for publisher in publishers)
+    return {
+        "sessions": len(traces),
+        "subscribers_per_session": subscribers,
+        "format": "binary" if binary else "json",
+        "seconds": elapsed,
+        "published_frames": published,
+        "published_fps": published / elapsed,
+        "delivered_frames": sum(client_stats["frames"] for client_stats in stats),
+        "expected_frames": published * subscribers,
+        "messages": sum(client_stats["messages"] for client_stats in stats),
+        "bytes_per_frame": sum(client_stats["bytes"] for client_stats in stats) / max(published * subscribers, 1),
+        "events": sum(client_stats["events"] for client_stats in stats),
+        "fanout_latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "fanout_latency_p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else None,
+        "reps": [publisher.counter.reps[0].tolist() for publisher in publishers],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load-test the rep event server by replaying landmark traces to many WebSocket subscribers.")
+    parser.add_argument("traces", nargs="*", help="Trace files, one session each (default: synthetic traces)")
+    parser.add_argument("--choice", type=int, choices=[1, 2, 3, 4], default=1,
+                        help="1: right arm curls, 2: left arm curls, 3: both arms curls, 4: squats")
+    parser.add_argument("--sessions", type=int, default=4, help="Synthetic sessions when no traces are given")
+    parser.add_argument("--subscribers", type=int, default=10, help="Subscribers per session")
+    parser.add_argument("--binary", action="store_true", help="Subscribe to binary angle batches instead of JSON")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up; 0 replays as fast as possible")
+    parser.add_argument("--batch-interval", type=float, default=0.1, help="Server batch interval in seconds")
+    args = parser.parse_args()
+
+    if args.traces:
+        traces = [load_trace(path) for path in args.traces]
+    else:
+        traces = []
+        for seed in range(args.sessions):
+            landmarks, timestamps, _ = synthetic_trace(args.choice, reps=5, seed=seed)
+            trace = np.empty(len(landmarks), dtype=TRACE_DTYPE)
+            trace["timestamp"], trace["landmarks"] = timestamps, landmarks
+            traces.append(trace)
+
+    results = asyncio.run(load_test(traces, CHOICES[args.choice], args.subscribers, args.binary, args.speed,
+                                    args.batch_interval))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
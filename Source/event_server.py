@@ -0,0 +1,354 @@
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from async_sessions import RepEvent, rep_events
+from exercises import RepCounter
+from kinematics import JOINT_NAMES, joint_angles, landmark_array
+from rep_quality import RepAnalyzer
+
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# Binary angle batch: magic, frame count, joint count, sent_at (time.time()), then
+# float64 timestamps and int16 angle rows in tenths of a degree
+BINARY_HEADER = struct.Struct("<4sHHd")
+BINARY_MAGIC = b"REP1"
+MISSING = -32768  # int16 angle row of a frame without a pose
+
+
+def encode_frame(opcode, payload):
+    """Encode one unmasked (server to client) WebSocket frame."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_frame(reader):
+    """Read one WebSocket frame and return (opcode, payload), unmasking client frames."""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length, = struct.unpack("!H", await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack("!Q", await reader.readexactly(8))
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return first & 0x0F, payload
+
+
+def delta_rows(angles):
+    """Encode a (frames, joints) angle batch as int tenths of a degree, each row relative to the one before.
+
+    The first row, rows without a pose (None) and rows after one are absolute,
+    so every batch decodes on its own.
+    """
+    rows = []
+    previous = None
+    for row in angles:
+        if np.isnan(row).any():
+            rows.append(None)
+            previous = None
+            continue
+        tenths = np.rint(row * 10).astype(np.int32)
+        rows.append((tenths if previous is None else tenths - previous).tolist())
+        previous = tenths
+    return rows
+
+
+def decode_rows(rows):
+    """Inverse of delta_rows: return the (frames, joints) angles in degrees, NaN where there was no pose."""
+    angles = np.full((len(rows), len(JOINT_NAMES)), np.nan)
+    previous = None
+    for i, row in enumerate(rows):
+        if row is None:
+            previous = None
+            continue
+        previous = np.asarray(row) if previous is None else previous + row
+        angles[i] = previous / 10
+    return angles
+
+
+def encode_binary(timestamps, angles, sent_at):
+    rows = delta_rows(angles)
+    packed = np.array([row if row is not None else [MISSING] * len(JOINT_NAMES) for row in rows], dtype=np.int16)
+    return (BINARY_HEADER.pack(BINARY_MAGIC, len(rows), len(JOINT_NAMES), sent_at)
+            + np.asarray(timestamps, dtype=np.float64).tobytes() + packed.tobytes())
+
+
+def decode_binary(payload):
+    """Return (timestamps, angles, sent_at) of a binary angle batch."""
+    magic, frames, joints, sent_at = BINARY_HEADER.unpack_from(payload)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not an angle batch")
+    offset = BINARY_HEADER.size
+    timestamps = np.frombuffer(payload, dtype=np.float64, count=frames, offset=offset)
+    packed = np.frombuffer(payload, dtype=np.int16, count=frames * joints, offset=offset + 8 * frames)
+    rows = [None if row[0] == MISSING else row.astype(np.int32) for row in packed.reshape(frames, joints)]
+    return timestamps, decode_rows(rows), sent_at
+
+
+class Channel:
+    """Pending updates and subscribers of one session."""
+
+    def __init__(self):
+        self.timestamps = []
+        self.angles = []
+        self.events = []
+        self.subscribers = set()
+
+
+class Subscriber:
+    def __init__(self, writer, binary, queue_size):
+        self.writer = writer
+        self.binary = binary
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def send(self, frame):
+        if self.queue.full():
+            self.queue.get_nowait()  # A slow subscriber skips the oldest batch instead of holding up the rest
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+
+class EventServer:
+    """Stream per-frame joint angles and rep events over WebSocket from a background thread.
+
+    Publishers call publish_frame() and publish_event() from any thread.
+    Every batch_interval seconds the updates of each session are encoded once
+    and sent to all of its subscribers at ws://host:port/sessions/<session>,
+    as JSON text messages or, with ?format=binary, packed int16 angle deltas
+    (events are always JSON). A subscriber that falls more than queue_size
+    batches behind loses its oldest batches. GET /sessions lists the sessions.
+    """
+
+    def __init__(self, port, host="127.0.0.1", batch_interval=0.1, queue_size=16):
+        self.host = host
+        self.port = port
+        self.batch_interval = batch_interval
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.channels = {}
+        self.sent_bytes = 0
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="event server", daemon=True)
+        self.error = None
+        self.thread.start()
+        self.started.wait()
+        if self.error is not None:
+            raise self.error
+
+    def _channel(self, session):
+        channel = self.channels.get(session)
+        if channel is None:
+            channel = self.channels[session] = Channel()
+        return channel
+
+    def publish_frame(self, session, timestamp, angles):
+        with self.lock:
+            channel = self._channel(str(session))
+            channel.timestamps.append(timestamp)
+            channel.angles.append(angles)
+
+    def publish_event(self, session, event):
+        with self.lock:
+            self._channel(str(session)).events.append(event)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        except OSError as e:
+            self.error = e
+            self.started.set()
+            return
+        self.port = self.server.sockets[0].getsockname()[1]  # The chosen port when port is 0
+        self.flusher = self.loop.create_task(self._flush_loop())
+        self.started.set()
+        self.loop.run_forever()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.batch_interval)
+            self.flush()
+
+    def flush(self):
+        """Encode the pending updates of every session once and queue them for its subscribers."""
+        with self.lock:
+            pending = []
+            for session, channel in self.channels.items():
+                if channel.timestamps or channel.events:
+                    pending.append((session, channel, channel.timestamps, channel.angles, channel.events))
+                    channel.timestamps, channel.angles, channel.events = [], [], []
+
+        sent_at = time.time()
+        for session, channel, timestamps, angles, events in pending:
+            if not channel.subscribers:
+                continue
+            text = binary = None
+            if any(not subscriber.binary for subscriber in channel.subscribers):
+                text = encode_frame(OP_TEXT, json.dumps({
+                    "session": session,
+                    "sent_at": sent_at,
+                    "timestamps": [round(t, 4) for t in timestamps],
+                    "angles": delta_rows(np.array(angles).reshape(-1, len(JOINT_NAMES))),
+                    "events": events,
+                }, separators=(",", ":")).encode())
+            if any(subscriber.binary for subscriber in channel.subscribers):
+                binary = []
+                if timestamps:
+                    binary.append(encode_frame(OP_BINARY, encode_binary(timestamps, np.array(angles), sent_at)))
+                if events:
+                    binary.append(encode_frame(OP_TEXT, json.dumps(
+                        {"session": session, "sent_at": sent_at, "events": events}).encode()))
+                binary = b"".join(binary)
+            for subscriber in channel.subscribers:
+                subscriber.send(binary if subscriber.binary else text)
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        lines = request.decode("latin-1").split("\r\n")
+        path = urlsplit(lines[0].split(" ")[1]) if len(lines[0].split(" ")) > 1 else urlsplit("/")
+        headers = {name.strip().lower(): value.strip()
+                   for name, _, value in (line.partition(":") for line in lines[1:] if line)}
+
+        if path.path == "/sessions":
+            with self.lock:
+                body = json.dumps(sorted(self.channels)).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: "
+                         + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+            writer.close()
+            return
+        key = headers.get("sec-websocket-key")
+        if not path.path.startswith("/sessions/") or key is None:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            writer.close()
+            return
+
+        accept = base64.b64encode(hashlib.sha1(key.encode() + WEBSOCKET_GUID).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        session = path.path[len("/sessions/"):]
+        binary = parse_qs(path.query).get("format") == ["binary"]
+        writer.write(encode_frame(OP_TEXT, json.dumps(
+            {"session": session, "joints": JOINT_NAMES, "format": "binary" if binary else "json"}).encode()))
+
+        subscriber = Subscriber(writer, binary, self.queue_size)
+        with self.lock:
+            self._channel(session).subscribers.add(subscriber)
+        sender = asyncio.create_task(self._send_loop(subscriber))
+        try:
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == OP_CLOSE:
+                    writer.write(encode_frame(OP_CLOSE, payload[:2]))
+                    break
+                if opcode == OP_PING:
+                    writer.write(encode_frame(OP_PONG, payload))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # Cancelled only by stop(); ending quietly keeps asyncio from logging it
+        finally:
+            with self.lock:
+                self.channels[session].subscribers.discard(subscriber)
+            sender.cancel()
+            writer.close()
+
+    async def _send_loop(self, subscriber):
+        try:
+            while True:
+                frame = await subscriber.queue.get()
+                subscriber.writer.write(frame)
+                self.sent_bytes += len(frame)
+                await subscriber.writer.drain()
+        except ConnectionError:
+            pass
+
+    def subscriber_count(self, session=None):
+        with self.lock:
+            channels = self.channels.values() if session is None else [self.channels.get(str(session), Channel())]
+            return sum(len(channel.subscribers) for channel in channels)
+
+    async def _shutdown(self):
+        self.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class RepPublisher:
+    """Count reps from landmarks and publish the angles and rep events of every frame to an EventServer.
+
+    Has the write(results, timestamp) / write_array(landmarks, timestamp)
+    interface of landmark_trace.TraceWriter, so it fits wherever frames are
+    recorded. Events are async_sessions.RepEvent dicts, with a "complete"
+    event once every exercise reaches target_reps, and a "quality" event with
+    the rep_quality.RepStats of every rep. After follow(), the reps are those
+    of another counter instead of its own.
+    """
+
+    def __init__(self, server, session, exercise_names, target_reps=None):
+        self.server = server
+        self.session = str(session)
+        self.counter = RepCounter(exercise_names)
+        self.analyzer = RepAnalyzer(exercise_names)
+        self.target_reps = target_reps
+        self.source = None
+        self.frames = 0
+
+    def follow(self, counter):
+        """Publish the reps of counter, e.g. a streams.Detector's, which its owner updates before each write()."""
+        if counter.table.names != self.counter.table.names:
+            raise ValueError(f"Cannot follow a counter of {counter.table.names}, expected {self.counter.table.names}")
+        self.source = counter
+
+    def write(self, results, timestamp=None):
+        self.write_array(landmark_array(results), timestamp)
+
+    def write_array(self, landmarks, timestamp=None):
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        angles = joint_angles(landmarks)
+        previous_phase = self.counter.phase[0].copy()
+        counted = self.counter.update(angles) if self.source is None else self.counter.follow(self.source)
+        self.server.publish_frame(self.session, timestamp, angles)
+        self.frames += 1
+        for event in rep_events(self.session, self.counter, counted, previous_phase, timestamp):
+            self.server.publish_event(self.session, event._asdict())
+        for stats in self.analyzer.update(angles, counted[0], timestamp):
+            self.server.publish_event(self.session, {"session": self.session, "kind": "quality", **stats._asdict()})
+        if counted.any() and self.target_reps and (self.counter.reps >= self.target_reps).all():
+            self.server.publish_event(self.session, RepEvent(self.session, "complete", None, self.target_reps, None,
+                                                             timestamp)._asdict())
@@ -0,0 +1,168 @@
+import numpy as np
+
+from kinematics import JOINT_NAMES, joint_angles
+
+
+class Exercise:
+    """Declarative definition of a repetition exercise.
+
+    joints are names from kinematics.JOINTS. phases maps each phase name to a
+    ("below" | "above", angle) condition that every joint must meet to enter it;
+    conditions are checked in order, like an if/elif chain. A rep is counted on
+    every transition into count_phase. concentric_phase is the phase the
+    working (shortening) half of the movement heads for, count_phase unless
+    given.
+    """
+
+    def __init__(self, name, label, joints, phases, count_phase, start_phase, concentric_phase=None):
+        self.name = name
+        self.label = label
+        self.joints = tuple(joints)
+        self.phases = dict(phases)
+        self.count_phase = count_phase
+        self.start_phase = start_phase
+        self.concentric_phase = concentric_phase or count_phase
+
+    def phase_names(self):
+        return list(self.phases)
+
+    def step(self, phase, angles):
+        """Advance one frame for a single person; returns (new_phase, rep_counted)."""
+        for name, (direction, threshold) in self.phases.items():
+            if direction == "below":
+                entered = all(angle < threshold for angle in angles)
+            else:
+                entered = all(angle > threshold for angle in angles)
+            if entered:
+                return name, name != phase and name == self.count_phase
+        return phase, False
+
+
+EXERCISES = {}
+
+
+def register(exercise):
+    EXERCISES[exercise.name] = exercise
+    return exercise
+
+
+register(Exercise("right_curls", "Right arm curls", ["right_elbow"],
+                  {"down": ("below", 40), "up": ("above", 130)}, count_phase="down", start_phase="up"))
+register(Exercise("left_curls", "Left arm curls", ["left_elbow"],
+                  {"down": ("below", 40), "up": ("above", 130)}, count_phase="down", start_phase="up"))
+register(Exercise("squats", "Squats", ["left_knee", "right_knee"],
+                  {"down": ("below", 100), "up": ("above", 160)}, count_phase="down", start_phase="up",
+                  concentric_phase="up"))
+
+# Menu choices of main.py and mainGUI.py
+CHOICES = {
+    1: ["right_curls"],
+    2: ["left_curls"],
+    3: ["right_curls", "left_curls"],
+    4: ["squats"],
+}
+
+
+class ExerciseTable:
+    """The definitions of several exercises packed into padded arrays for vectorized updates."""
+
+    def __init__(self, names):
+        self.names = list(names)
+        exercises = [EXERCISES[name] for name in self.names]
+        max_joints = max(len(exercise.joints) for exercise in exercises)
+        max_phases = max(len(exercise.phases) for exercise in exercises)
+        count = len(exercises)
+
+        self.joint_index = np.zeros((count, max_joints), dtype=np.intp)
+        self.joint_valid = np.zeros((count, max_joints), dtype=bool)
+        self.threshold = np.zeros((count, max_phases))
+        self.below = np.zeros((count, max_phases), dtype=bool)
+        self.phase_valid = np.zeros((count, max_phases), dtype=bool)
+        self.count_phase = np.zeros(count, dtype=np.int8)
+        self.start_phase = np.zeros(count, dtype=np.int8)
+        self.concentric_phase = np.zeros(count, dtype=np.int8)
+
+        for e, exercise in enumerate(exercises):
+            for j, joint in enumerate(exercise.joints):
+                self.joint_index[e, j] = JOINT_NAMES.index(joint)
+                self.joint_valid[e, j] = True
+            for p, (direction, threshold) in enumerate(exercise.phases.values()):
+                self.threshold[e, p] = threshold
+                self.below[e, p] = direction == "below"
+                self.phase_valid[e, p] = True
+            phases = exercise.phase_names()
+            self.count_phase[e] = phases.index(exercise.count_phase)
+            self.start_phase[e] = phases.index(exercise.start_phase)
+            self.concentric_phase[e] = phases.index(exercise.concentric_phase)
+
+    def match(self, angles):
+        """Return the phase each exercise enters for the given joint angles, or -1 for none.
+
+        angles has kinematics.JOINT_NAMES as its last axis, e.g. (people, joints)
+        or (frames, joints); the result has shape (..., exercises).
+        """
+        angles = np.asarray(angles)[..., self.joint_index]  # (..., E, J)
+        angles = angles[..., None]  # (..., E, J, 1) against (E, 1, P) thresholds
+        threshold = self.threshold[:, None, :]
+        passed = np.where(self.below[:, None, :], angles < threshold, angles > threshold)
+        passed |= ~self.joint_valid[:, :, None]
+        entered = passed.all(axis=-2) & self.phase_valid  # (..., E, P)
+        return np.where(entered.any(axis=-1), entered.argmax(axis=-1), -1)
+
+
+class RepCounter:
+    """Rep state machine for several exercises and several people, updated in one vectorized step."""
+
+    def __init__(self, names, people=1):
+        self.table = ExerciseTable(names)
+        self.phase = np.tile(self.table.start_phase, (people, 1))
+        self.reps = np.zeros(self.phase.shape, dtype=np.int32)
+
+    def update(self, angles):
+        """Advance one frame.
+
+        angles is (people, len(JOINT_NAMES)), or (len(JOINT_NAMES),) for one
+        person. Returns a (people, exercises) bool array of the reps counted.
+        """
+        entered = self.table.match(np.atleast_2d(angles))
+        new_phase = np.where(entered >= 0, entered, self.phase).astype(np.int8)
+        counted = (new_phase != self.phase) & (new_phase == self.table.count_phase)
+        self.phase = new_phase
+        self.reps += counted
+        return counted
+
+    def follow(self, counter):
+        """Take over the phases and reps of a counter that is updated elsewhere, e.g. streams.Detector.counter.
+
+        Returns the counted mask update() would have, so one state machine can
+        feed several consumers without each of them counting again.
+        """
+        counted = counter.reps > self.reps
+        self.phase = counter.phase.copy()
+        self.reps = counter.reps.copy()
+        return counted
+
+    def update_landmarks(self, landmarks):
+        """Advance one frame from (people, 33, 3+) landmarks."""
+        return self.update(joint_angles(landmarks))
+
+    def phase_name(self, person, exercise):
+        name = self.table.names[exercise]
+        return EXERCISES[name].phase_names()[self.phase[person, exercise]]
+
+
+def count_reps(angles, names):
+    """Count the reps of each named exercise over a whole (frames, joints) angle series.
+
+    Gives the same counts as feeding the frames one by one to a RepCounter, but
+    vectorized over time as well.
+    """
+    table = ExerciseTable(names)
+    entered = table.match(angles)  # (frames, E)
+    counts = {}
+    for e, name in enumerate(table.names):
+        phases = entered[:, e]
+        phases = phases[phases >= 0]
+        previous = np.concatenate(([table.start_phase[e]], phases[:-1]))
+        counts[name] = int(np.count_nonzero((phases != previous) & (phases == table.count_phase[e])))
+    return counts
@@ -0,0 +1,81 @@
+import threading
+
+import cv2
+import numpy as np
+
+FREE = 0
+WRITING = 1  # Owned by the pose worker
+DISPLAYING = 2  # Handed to the UI thread
+
+MIN_SIZE = 16
+
+
+class FrameRing:
+    """Preallocated display buffers handed from the pose worker to the UI thread.
+
+    The worker acquire()s a free slot, write()s the frame into it (scaled once
+    to the display size, straight into the preallocated buffer) and publish()es
+    it by sending the slot index to the UI thread. The UI owns the slot until it
+    release()s it. When the UI still holds every slot, acquire() returns None
+    and the frame is dropped instead of queueing stale frames.
+
+    Frames stay BGR, which Qt 5.14+ displays directly as QImage.Format_BGR888.
+    With swap_rb set (older Qt), the worker swaps to RGB in place.
+    """
+
+    def __init__(self, slots=3, swap_rb=False):
+        self.lock = threading.Lock()
+        self.states = [FREE] * slots
+        self.buffers = [None] * slots
+        self.target_size = None  # (width, height) available for display
+        self.swap_rb = swap_rb
+        self.dropped = 0
+
+    def set_target_size(self, width, height):
+        with self.lock:
+            self.target_size = (max(width, MIN_SIZE), max(height, MIN_SIZE))
+
+    def acquire(self):
+        with self.lock:
+            for slot, state in enumerate(self.states):
+                if state == FREE:
+                    self.states[slot] = WRITING
+                    return slot
+            self.dropped += 1
+            return None
+
+    def display_size(self, width, height):
+        """Largest size with the frame's aspect ratio that fits the target size."""
+        with self.lock:
+            target = self.target_size
+        if target is None:
+            return width, height
+        scale = min(target[0] / width, target[1] / height)
+        return max(int(width * scale), 1), max(int(height * scale), 1)
+
+    def write(self, slot, img):
+        """Scale img into the slot's buffer and return the buffer."""
+        width, height = self.display_size(img.shape[1], img.shape[0])
+        buffer = self.buffers[slot]
+        if buffer is None or buffer.shape[:2] != (height, width):
+            buffer = self.buffers[slot] = np.empty((height, width, 3), dtype=np.uint8)
+
+        if (width, height) == (img.shape[1], img.shape[0]):
+            np.copyto(buffer, img)
+        else:
+            interpolation = cv2.INTER_AREA if width < img.shape[1] else cv2.INTER_LINEAR
+            cv2.resize(img, (width, height), dst=buffer, interpolation=interpolation)
+        if self.swap_rb:
+            cv2.cvtColor(buffer, cv2.COLOR_BGR2RGB, dst=buffer)
+        return buffer
+
+    def publish(self, slot):
+        with self.lock:
+            self.states[slot] = DISPLAYING
+
+    def frame(self, slot):
+        return self.buffers[slot]
+
+    def release(self, slot):
+        with self.lock:
+            self.states[slot] = FREE
@@ -0,0 +1,124 @@
+import math
+from types import SimpleNamespace
+
+import numpy as np
+
+from exercises import ExerciseTable
+from kinematics import joint_angles, landmark_array
+
+
+class FrameSkipper:
+    """Run pose inference only every Nth frame when it cannot keep up with the camera.
+
+    The stride N follows the measured inference time, with headroom, divided
+    by the camera's frame interval (capped at max_stride). The interval is
+    measured on every captured frame by observe_frame(), before any queue can
+    drop one. Skipped frames get landmarks extrapolated at constant velocity
+    from the last two inferences, each landmark moving at most max_shift
+    (normalized image units) and no further ahead than max_stride frames.
+
+    Predicted frames never change an exercise stage on their own: inference
+    runs on every frame while a tracked joint is, was at the last inference,
+    or before the next scheduled one will be within guard_band degrees of one
+    of the exercise thresholds, however many frames are waiting, and a
+    prediction that would still put a joint on the other side of a threshold
+    than the last inference holds the last inferred landmarks instead.
+
+    queue_size is how many frames a pipeline should hold for it: the frames
+    captured during one inference wait there and get predicted results, so
+    away from the thresholds every captured frame reaches the counters.
+    """
+
+    def __init__(self, exercise_names, max_stride=4, guard_band=15.0, smoothing=0.9, headroom=1.2, max_shift=0.05):
+        table = ExerciseTable(exercise_names)
+        self.joints = np.unique(table.joint_index[table.joint_valid])
+        self.thresholds = np.unique(table.threshold[table.phase_valid])
+        self.max_stride = max_stride
+        self.guard_band = guard_band
+        self.smoothing = smoothing
+        self.headroom = headroom
+        self.max_shift = max_shift
+        self.queue_size = 2 * max_stride
+
+        self.inference_time = 0.0
+        self.frame_interval = 0.0
+        self.stride = 1
+        self.since_inference = 0
+        self.last_timestamp = None
+        self.history = []  # Last two (timestamp, landmarks, results) inferences
+        self.angles = None  # Tracked joint angles of the last inference
+        self.predicted_frames = 0
+
+    def observe_frame(self, timestamp):
+        """Record that the camera delivered a frame at timestamp; called for every captured frame."""
+        if self.last_timestamp is not None:
+            interval = timestamp - self.last_timestamp
+            self.frame_interval = interval if self.frame_interval == 0 else (
+                self.smoothing * self.frame_interval + (1 - self.smoothing) * interval)
+        self.last_timestamp = timestamp
+
+    def should_infer(self, timestamp):
+        """Decide whether the frame captured at timestamp needs a real inference."""
+        if len(self.history) < 2 or self.history[-1][2].pose_landmarks is None:
+            return True
+        if self.since_inference + 1 >= self.stride:
+            return True
+        return self.near_threshold(timestamp)
+
+    def near_threshold(self, timestamp):
+        """Whether a joint angle is close to a threshold at the last inference, now, or at the next scheduled one."""
+        now = joint_angles(self.extrapolate(timestamp))[self.joints]
+        later = joint_angles(self.extrapolate(timestamp + self.stride * self.frame_interval))[self.joints]
+        low = np.fmin(np.fmin(now, later), self.angles)[:, None] - self.guard_band
+        high = np.fmax(np.fmax(now, later), self.angles)[:, None] + self.guard_band
+        return bool(np.any((low <= self.thresholds) & (self.thresholds <= high)))
+
+    def crosses_threshold(self, landmarks):
+        """Whether landmarks put a tracked joint on the other side of a threshold than the last inference."""
+        angles = joint_angles(landmarks)[self.joints]
+        known = ~(np.isnan(angles) | np.isnan(self.angles))
+        return bool(np.any((angles[known, None] < self.thresholds) != (self.angles[known, None] < self.thresholds)))
+
+    def observe(self, results, timestamp, inference_time):
+        """Record a real inference and how long it took, in seconds."""
+        self.inference_time = inference_time if self.inference_time == 0 else (
+            self.smoothing * self.inference_time + (1 - self.smoothing) * inference_time)
+        if self.frame_interval > 0:
+            frames = self.inference_time * self.headroom / self.frame_interval
+            self.stride = min(max(math.ceil(frames), 1), self.max_stride)
+
+        landmarks = landmark_array(results)
+        self.history = (self.history + [(timestamp, landmarks, results)])[-2:]
+        self.angles = joint_angles(landmarks)[self.joints]
+        self.since_inference = 0
+
+    def extrapolate(self, timestamp):
+        (t0, landmarks0, _), (t1, landmarks1, _) = self.history
+        if np.isnan(landmarks0[0, 0]) or t1 <= t0:
+            return landmarks1
+        velocity = (landmarks1[:, :3] - landmarks0[:, :3]) / (t1 - t0)
+        elapsed = timestamp - t1
+        if self.frame_interval > 0:
+            elapsed = min(elapsed, self.max_stride * self.frame_interval)
+        predicted = landmarks1.copy()
+        predicted[:, :3] += np.clip(velocity * elapsed, -self.max_shift, self.max_shift)
+        return predicted
+
+    def predict(self, timestamp):
+        """Return results for a skipped frame, with landmarks moved on at constant velocity.
+
+        When the move would change an exercise stage, the landmarks stay where
+        the last inference put them, so only a real inference can finish a rep.
+        """
+        self.since_inference += 1
+        self.predicted_frames += 1
+        predicted = self.extrapolate(timestamp)
+        if self.crosses_threshold(predicted):
+            predicted = self.history[-1][1]
+
+        last = self.history[-1][2].pose_landmarks
+        pose_landmarks = type(last)()
+        pose_landmarks.CopyFrom(last)  # Keeps the MediaPipe type, so draw_landmarks works on it
+        for lm, (x, y, z, _) in zip(pose_landmarks.landmark, predicted.tolist()):
+            lm.x, lm.y, lm.z = x, y, z
+        return SimpleNamespace(pose_landmarks=pose_landmarks, predicted=True)
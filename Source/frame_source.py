@@ -0,0 +1,195 @@
+import argparse
+import queue
+import threading
+import time
+
+import cv2
+
+
+def open_capture(path, hw_decode=True):
+    """Open a video file, with hardware-accelerated decoding when this OpenCV build and the host support it."""
+    if hw_decode and hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+        cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        if cap.isOpened():
+            return cap
+    return cv2.VideoCapture(path)
+
+
+class FrameSource:
+    """Frames of a recorded video between start and end seconds, every stride-th frame, decoded ahead on a thread.
+
+    Frames that are skipped by the stride are only grabbed, never converted
+    or resized. When a stride is long enough that seeking (to the previous
+    keyframe and decoding forward from it) is cheaper than grabbing every
+    frame in between, the decode thread seeks instead; it times both and
+    picks the cheaper one as it goes. Kept frames are scaled to percent of
+    their size on the decode thread as soon as they are decoded, so the
+    consumer only ever sees frames of the size it asked for.
+
+    Iterating yields (index, timestamp, img) with the frame index and its
+    time in seconds in the video. read(), isOpened(), get() and release()
+    stand in for a cv2.VideoCapture, e.g. in pipeline.PosePipeline or
+    streams.capture(), and get_frame()/rescale_frame() for a
+    video_handler.VideoHandler: FrameSource(path, percent=75).get_frame()
+    returns what VideoHandler(path).get_frame() does.
+    """
+
+    def __init__(self, path, start=0.0, end=None, stride=1, percent=100, prefetch=8, hw_decode=True):
+        self.path = path
+        self.cap = open_capture(path, hw_decode)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video file {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.start_frame = round(start * self.fps)
+        self.end_frame = round(end * self.fps) if end is not None else None
+        self.stride = max(int(stride), 1)
+        self.percent = percent
+
+        self.frames = queue.Queue(maxsize=prefetch)
+        self.thread = None
+        self.running = False
+        self.finished = False
+        self.grab_time = None  # Smoothed seconds per grabbed frame
+        self.seek_time = None  # Smoothed seconds per seek
+        self.grabbed = 0
+        self.seeks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def __iter__(self):
+        while True:
+            item = self.next()
+            if item is None:
+                return
+            yield item
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._decode, name="frame source", daemon=True)
+            self.thread.start()
+        return self
+
+    def next(self):
+        """Return the next (index, timestamp, img), or None at the end of the range."""
+        if self.finished:
+            return None
+        self.start()
+        item = self.frames.get()
+        if item is None:
+            self.finished = True
+        return item
+
+    @staticmethod
+    def _smooth(previous, seconds):
+        return seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+    def _seek(self, index):
+        start = time.perf_counter()
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self.seek_time = self._smooth(self.seek_time, time.perf_counter() - start)
+        self.seeks += 1
+        position = self.cap.get(cv2.CAP_PROP_POS_FRAMES)
+        return int(position) if position >= 0 else index  # Where the container actually landed
+
+    def _skip(self, index, count):
+        """Move past count frames after index, by seeking or grabbing, whichever is cheaper; returns the new index."""
+        if count <= 0:
+            return index
+        # Try one seek as soon as grabbing has been timed, then keep to the cheaper of the two
+        if self.grab_time is not None and (self.seek_time is None or self.seek_time < count * self.grab_time):
+            return self._seek(index + count)
+        for _ in range(count):
+            start = time.perf_counter()
+            if not self.cap.grab():
+                return None
+            self.grab_time = self._smooth(self.grab_time, time.perf_counter() - start)
+            self.grabbed += 1
+        return index + count
+
+    def _put(self, item):
+        while self.running:
+            try:
+                self.frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _decode(self):
+        try:
+            index = self._seek(self.start_frame) if self.start_frame else 0
+            while self.running and (self.end_frame is None or index < self.end_frame):
+                success, img = self.cap.read()
+                if not success:
+                    break
+                if self.percent != 100:
+                    img = self.rescale_frame(img, self.percent)
+                self._put((index, index / self.fps, img))
+                index = self._skip(index + 1, self.stride - 1)
+                if index is None:
+                    break
+        finally:
+            self._put(None)
+
+    def read(self):
+        """Like cv2.VideoCapture.read(): (True, img) for the next kept frame, (False, None) at the end."""
+        item = self.next()
+        if item is None:
+            return False, None
+        return True, item[2]
+
+    def get_frame(self):
+        item = self.next()
+        return None if item is None else item[2]
+
+    def rescale_frame(self, frame, percent=75):
+        width = int(frame.shape[1] * percent / 100)
+        height = int(frame.shape[0] * percent / 100)
+        return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+    def isOpened(self):
+        return self.cap.isOpened() and not self.finished
+
+    def get(self, prop):
+        """cv2.VideoCapture.get() of the sampled stream: the frame rate and count are those after the stride."""
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps / self.stride
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            end = self.frame_count if self.end_frame is None else min(self.end_frame, self.frame_count)
+            return max(-(-(end - self.start_frame) // self.stride), 0)
+        return self.cap.get(prop)
+
+    def release(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.finished = True
+        self.cap.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode a window of a recorded video and report the decode rate.")
+    parser.add_argument("video")
+    parser.add_argument("--start", type=float, default=0.0, help="Start time in seconds")
+    parser.add_argument("--end", type=float, default=None, help="End time in seconds (default: end of the video)")
+    parser.add_argument("--stride", type=int, default=1, help="Keep every Nth frame")
+    parser.add_argument("--percent", type=float, default=100, help="Scale kept frames to this percentage")
+    parser.add_argument("--no-hw-decode", action="store_true", help="Decode in software")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with FrameSource(args.video, args.start, args.end, args.stride, args.percent,
+                     hw_decode=not args.no_hw_decode) as source:
+        frames = sum(1 for _ in source)
+        elapsed = time.perf_counter() - start
+        print(f"{frames} frames in {elapsed:.2f} s ({frames / max(elapsed, 1e-9):.1f} frames/s), "
+              f"{source.grabbed} skipped frames grabbed, {source.seeks} seeks")
+
+
+if __name__ == "__main__":
+    main()
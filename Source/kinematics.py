@@ -0,0 +1,142 @@
+import math
+from enum import IntEnum
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+
+
+class PoseLandmark(IntEnum):
+    """MediaPipe Pose landmark indices (same values as mp.solutions.pose.PoseLandmark).
+
+    Kept here so the angle code does not need to import MediaPipe. The module
+    can also be passed as the mpPose argument of the detect_* functions.
+    """
+    NOSE = 0
+    LEFT_EYE_INNER = 1
+    LEFT_EYE = 2
+    LEFT_EYE_OUTER = 3
+    RIGHT_EYE_INNER = 4
+    RIGHT_EYE = 5
+    RIGHT_EYE_OUTER = 6
+    LEFT_EAR = 7
+    RIGHT_EAR = 8
+    MOUTH_LEFT = 9
+    MOUTH_RIGHT = 10
+    LEFT_SHOULDER = 11
+    RIGHT_SHOULDER = 12
+    LEFT_ELBOW = 13
+    RIGHT_ELBOW = 14
+    LEFT_WRIST = 15
+    RIGHT_WRIST = 16
+    LEFT_PINKY = 17
+    RIGHT_PINKY = 18
+    LEFT_INDEX = 19
+    RIGHT_INDEX = 20
+    LEFT_THUMB = 21
+    RIGHT_THUMB = 22
+    LEFT_HIP = 23
+    RIGHT_HIP = 24
+    LEFT_KNEE = 25
+    RIGHT_KNEE = 26
+    LEFT_ANKLE = 27
+    RIGHT_ANKLE = 28
+    LEFT_HEEL = 29
+    RIGHT_HEEL = 30
+    LEFT_FOOT_INDEX = 31
+    RIGHT_FOOT_INDEX = 32
+
+
+# Joint triplets (a, b, c): the angle is measured at b between b-a and b-c.
+JOINTS = {
+    "right_elbow": (PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_ELBOW, PoseLandmark.RIGHT_WRIST),
+    "left_elbow": (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_ELBOW, PoseLandmark.LEFT_WRIST),
+    "right_shoulder": (PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_ELBOW),
+    "left_shoulder": (PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_ELBOW),
+    "right_hip": (PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_KNEE),
+    "left_hip": (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_KNEE),
+    "right_knee": (PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_KNEE, PoseLandmark.RIGHT_ANKLE),
+    "left_knee": (PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_KNEE, PoseLandmark.LEFT_ANKLE),
+}
+JOINT_NAMES = list(JOINTS)
+JOINT_TRIPLETS = np.array([JOINTS[name] for name in JOINT_NAMES], dtype=np.intp)
+
+
+def calculate_angle(a, b, c):
+    """Calculate the angle at b, in degrees, between the lines b-a and b-c (x, y only)."""
+    radians = math.atan2(c[1] - b[1], c[0] - b[0]) - math.atan2(a[1] - b[1], a[0] - b[0])
+    angle = abs(math.degrees(radians))
+    return 360 - angle if angle > 180.0 else angle
+
+
+def landmark_array(results):
+    """Return the pose landmarks of one frame as a (33, 4) float32 array of x, y, z, visibility.
+
+    Frames without a detected pose are all NaN, so their angles come out as NaN.
+    """
+    landmarks = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)
+    fill_landmarks(landmarks, results)
+    return landmarks
+
+
+def fill_landmarks(landmarks, results):
+    """Copy the pose landmarks of one frame into a preallocated C-contiguous (33, 4) float32 array.
+
+    Writes straight from the landmark objects into the array's memory, with no
+    tuples, lists or arrays created per frame. The array is all NaN when no
+    pose was found. Returns whether one was.
+    """
+    if not results.pose_landmarks:
+        landmarks.fill(np.nan)
+        return False
+    flat = memoryview(landmarks).cast("B").cast("f")
+    i = 0
+    for lm in results.pose_landmarks.landmark:
+        flat[i] = lm.x
+        flat[i + 1] = lm.y
+        flat[i + 2] = lm.z
+        flat[i + 3] = lm.visibility
+        i += 4
+    return True
+
+
+def joint_angles(landmarks, triplets=JOINT_TRIPLETS, mode="2d"):
+    """Calculate every joint angle for every frame in one vectorized pass.
+
+    landmarks is an array of shape (frames, 33, 3) or more columns (x, y, z, ...),
+    or (33, 3) for a single frame. triplets is an (n, 3) array of landmark
+    indices, JOINT_TRIPLETS by default. Returns an array of shape (frames, n) in
+    degrees (or (n,) for a single frame).
+
+    mode "2d" matches calculate_angle and ignores z. Mode "3d" measures the true
+    angle between the two limb vectors using z as well; it is NaN when two
+    landmarks of a triplet coincide.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float64)
+    triplets = np.asarray(triplets, dtype=np.intp)
+    a = landmarks[..., triplets[:, 0], :]
+    b = landmarks[..., triplets[:, 1], :]
+    c = landmarks[..., triplets[:, 2], :]
+
+    if mode == "2d":
+        ba = a[..., :2] - b[..., :2]
+        bc = c[..., :2] - b[..., :2]
+        radians = np.arctan2(bc[..., 1], bc[..., 0]) - np.arctan2(ba[..., 1], ba[..., 0])
+        angle = np.abs(np.degrees(radians))
+        return np.where(angle > 180.0, 360.0 - angle, angle)
+
+    if mode == "3d":
+        ba = a[..., :3] - b[..., :3]
+        bc = c[..., :3] - b[..., :3]
+        dot = np.einsum("...k,...k->...", ba, bc)
+        norms = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cosine = np.clip(dot / norms, -1.0, 1.0)
+        return np.degrees(np.arccos(cosine))
+
+    raise ValueError(f"Unknown angle mode: {mode}")
+
+
+def joint_index(name):
+    """Column of the named joint in the output of joint_angles with the default triplets."""
+    return JOINT_NAMES.index(name)
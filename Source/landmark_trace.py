@@ -0,0 +1,144 @@
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from kinematics import NUM_LANDMARKS, landmark_array
+from streams import Detector
+
+# File layout: a 16 byte header followed by fixed-size records, so a trace can
+# be appended to while recording and memory-mapped as one array when replaying.
+MAGIC = b"POSETRC1"
+HEADER_SIZE = 16
+TRACE_DTYPE = np.dtype([
+    ("timestamp", "<f8"),  # Seconds since the first recorded frame
+    ("landmarks", "<f4", (NUM_LANDMARKS, 4)),  # x, y, z, visibility; NaN when no pose was found
+])
+
+Landmark = namedtuple("Landmark", ["x", "y", "z", "visibility"])
+
+
+class TraceWriter:
+    """Append per-frame pose landmarks to a trace file, flushing in chunks."""
+
+    def __init__(self, path, chunk_size=256):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + bytes(HEADER_SIZE - len(MAGIC)))
+        self.chunk = np.zeros(chunk_size, dtype=TRACE_DTYPE)
+        self.pending = 0
+        self.frames = 0
+        self.start_time = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, results, timestamp=None):
+        """Record one frame of MediaPipe results, timestamped with time.perf_counter() by default."""
+        self.write_array(landmark_array(results), timestamp)
+
+    def write_array(self, landmarks, timestamp=None):
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = timestamp
+
+        record = self.chunk[self.pending]
+        record["timestamp"] = timestamp - self.start_time
+        record["landmarks"] = landmarks
+        self.pending += 1
+        self.frames += 1
+        if self.pending == len(self.chunk):
+            self.flush()
+
+    def flush(self):
+        self.chunk[:self.pending].tofile(self.file)
+        self.pending = 0
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+
+def save_trace(path, landmarks, timestamps):
+    """Write a whole (frames, 33, 4) landmark array and its timestamps as a trace file."""
+    with TraceWriter(path, chunk_size=max(len(landmarks), 1)) as writer:
+        for frame, timestamp in zip(landmarks, timestamps):
+            writer.write_array(frame, timestamp)
+
+
+def load_trace(path):
+    """Memory-map a trace file; returns a record array with "timestamp" and "landmarks" columns."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a landmark trace file")
+        if not f.read(1):
+            return np.zeros(0, dtype=TRACE_DTYPE)  # Nothing recorded; an empty file cannot be mapped
+    return np.memmap(path, dtype=TRACE_DTYPE, mode="r", offset=HEADER_SIZE)
+
+
+class ReplayResults:
+    """Stand-in for MediaPipe's pose results, built from one recorded frame."""
+
+    def __init__(self, landmarks):
+        if np.isnan(landmarks[0, 0]):
+            self.pose_landmarks = None
+        else:
+            self.pose_landmarks = ReplayLandmarkList(list(map(Landmark._make, landmarks.tolist())))
+
+
+class ReplayLandmarkList:
+    def __init__(self, landmark):
+        self.landmark = landmark
+
+
+def replay(path):
+    """Yield (timestamp, results) for every frame of a trace, without running pose inference.
+
+    The results can be passed straight to the detect_* functions or a
+    streams.Detector.
+    """
+    trace = load_trace(path)
+    for timestamp, landmarks in zip(trace["timestamp"], trace["landmarks"]):
+        yield float(timestamp), ReplayResults(landmarks)
+
+
+def replay_reps(path, choice, reps=0):
+    """Replay a trace through the detector for exercise choice 1-4 and return the rep counts."""
+    detector = Detector(choice, reps)
+    for landmarks in load_trace(path)["landmarks"]:
+        detector.update_array(landmarks)
+
+    if choice == 1:
+        return {"right": detector.reps_right}
+    if choice == 2:
+        return {"left": detector.reps_left}
+    if choice == 3:
+        return {"right": detector.reps_right, "left": detector.reps_left}
+    return {"squats": detector.reps_squats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a landmark trace through the rep detectors.")
+    parser.add_argument("trace", help="Trace file recorded with --record or batch.py --save-traces")
+    parser.add_argument("--choice", type=int, choices=[1, 2, 3, 4], required=True,
+                        help="1: right arm curls, 2: left arm curls, 3: both arms curls, 4: squats")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = replay_reps(args.trace, args.choice)
+    elapsed = time.perf_counter() - start
+    frames = len(load_trace(args.trace))
+    print(f"Reps: {counts}")
+    print(f"Replayed {frames} frames in {elapsed:.2f}s ({frames / max(elapsed, 1e-9):.0f} frames/s)")
+
+
+if __name__ == "__main__":
+    main()
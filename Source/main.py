@@ -1,163 +1,179 @@
-import cv2
-import mediapipe as mp
-from right_curls import detect_right_curls
-from left_curls import detect_left_curls
-from squats import detect_squats
-
-def get_user_input():
-    try:
-        print("Select the exercise:")
-        print("1. Right arm curls")
-        print("2. Left arm curls")
-        print("3. Both arms curls")
-        print("4. Squats")
-        print("Press 'q' to quit")
-        choice = int(input("Enter your choice (1/2/3/4): "))
-        reps = int(input("Enter the number of repetitions to complete: "))
-        if choice not in [1, 2, 3, 4] or reps <= 0:
-            raise ValueError("Invalid input. Please try again.")
-        return choice, reps
-    except ValueError as e:
-        print(f"Error: {e}")
-        return get_user_input()
-
-
-def run_pose_estimation(cap, pose, mpDraw, mpPose, choice, reps):
-    reps_completed_right = 0
-    reps_completed_left = 0
-    reps_completed = 0
-    arm_state_right = "up"
-    arm_state_left = "up"
-    prev_angle_right = 0
-    prev_angle_left = 0
-    leg_state = "up"
-
-    while True:
-        try:
-            success, img = cap.read()
-            if not success:
-                break
-
-            # Convert to RGB
-            imageRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            results = pose.process(imageRGB)
-
-            # Draw landmarks
-            if results.pose_landmarks:
-                mpDraw.draw_landmarks(img, results.pose_landmarks, mpPose.POSE_CONNECTIONS)
-
-            # Handle right arm curls
-            if choice == 1:
-                reps_completed_right, arm_state_right, prev_angle_right = detect_right_curls(
-                    img, results, mpPose, reps_completed_right, reps, arm_state_right, prev_angle_right)
-
-                cv2.putText(img, f"Right Reps: {reps_completed_right}/{reps}", (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-
-                if reps_completed_right == reps:
-                    print("Right arm curls completed!")
-                    cv2.putText(img, "Right arm curls completed!", (10, 110),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-                    cv2.imshow("Pose Estimation", img)
-                    cv2.waitKey(2000)
-
-                    return True
-
-            # Handle left arm curls
-            elif choice == 2:
-                reps_completed_left, arm_state_left, prev_angle_left = detect_left_curls(
-                    img, results, mpPose, reps_completed_left, reps, arm_state_left, prev_angle_left)
-
-                cv2.putText(img, f"Left Reps: {reps_completed_left}/{reps}", (10, 70),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-
-                if reps_completed_left == reps:
-                    print("Left arm curls completed!")
-                    cv2.putText(img, "Left arm curls completed!", (10, 110),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-                    cv2.imshow("Pose Estimation", img)
-                    cv2.waitKey(2000)
-
-                    return True
-
-            # Handle both arms curls
-            elif choice == 3:
-                reps_completed_right, arm_state_right, prev_angle_right = detect_right_curls(
-                    img, results, mpPose, reps_completed_right, reps, arm_state_right, prev_angle_right)
-                reps_completed_left, arm_state_left, prev_angle_left = detect_left_curls(
-                    img, results, mpPose, reps_completed_left, reps, arm_state_left, prev_angle_left)
-
-                # Display rep counts on the image
-                cv2.putText(img, f"Right Reps: {reps_completed_right}/{reps}", (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-                cv2.putText(img, f"Left Reps: {reps_completed_left}/{reps}", (10, 70),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-
-                if reps_completed_right == reps and reps_completed_left == reps:
-                    cv2.putText(img, "Both arms curls completed!", (10, 110),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-                    print("Both arms curls completed!")
-                    cv2.imshow("Pose Estimation", img)
-                    cv2.waitKey(2000)
-
-                    return True
-
-            # Handle squats
-            elif choice == 4:
-                reps_completed, leg_state, prev_angle_left, prev_angle_right = detect_squats(
-                    img, results, mpPose, reps_completed, reps, leg_state, prev_angle_left, prev_angle_right)
-
-                cv2.putText(img, f"Squats: {reps_completed}/{reps}", (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-
-                if reps_completed == reps:
-                    print("Squats completed!")
-                    cv2.putText(img, "Squats completed!", (10, 70),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-                    cv2.imshow("Pose Estimation", img)
-                    cv2.waitKey(2000)
-
-                    return True
-
-            # Show the frame
-            cv2.imshow("Pose Estimation", img)
-
-            # Exit if 'q' is pressed
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                break
-        except Exception as e:
-            print(f"Error: {e}")
-            break
-
-    return False
-
-
-if __name__ == "__main__":
-    while True:
-        try:
-            # Get user input for exercise choice and reps
-            choice, reps = get_user_input()
-
-            # Initialize MediaPipe Pose
-            mpDraw = mp.solutions.drawing_utils
-            mpPose = mp.solutions.pose
-            pose = mpPose.Pose()
-
-            # Open webcam
-            cap = cv2.VideoCapture(0)
-            if not cap.isOpened():
-                print("Error: Camera could not be opened.")
-                exit()
-
-            # Run pose estimation
-            if run_pose_estimation(cap, pose, mpDraw, mpPose, choice, reps):
-                print("Would you like to do another set?")
-                continue_input = input("Enter 'y' to continue or any other key to quit: ").strip().lower()
-                if continue_input != 'y':
-                    break  # Exit the loop if user does not want to continue
-        except Exception as e:
-            print(f"Error: {e}")
-            break
-        cap.release()
-        cv2.destroyAllWindows()
+import argparse
+import getpass
+import os
+import time
+
+import cv2
+from landmark_trace import TraceWriter
+from metrics import add_metrics_arguments, metrics_from_args, stop_exporters
+from event_server import EventServer, RepPublisher
+from exercises import CHOICES
+from frame_skip import FrameSkipper
+from pipeline import PosePipeline
+from pose_service import PoseService
+from quality import add_quality_arguments, quality_from_args
+from render import RenderPolicy, add_render_arguments, render_policy_from_args
+from results_store import ResultsStore, SetRecorder
+from roi import RoiTracker
+from smoothing import LandmarkFilter
+import streams
+from streams import Detector
+
+def get_user_input():
+    try:
+        print("Select the exercise:")
+        print("1. Right arm curls")
+        print("2. Left arm curls")
+        print("3. Both arms curls")
+        print("4. Squats")
+        print("Press 'q' to quit")
+        choice = int(input("Enter your choice (1/2/3/4): "))
+        reps = int(input("Enter the number of repetitions to complete: "))
+        if choice not in [1, 2, 3, 4] or reps <= 0:
+            raise ValueError("Invalid input. Please try again.")
+        return choice, reps
+    except ValueError as e:
+        print(f"Error: {e}")
+        return get_user_input()
+
+
+def run_pose_estimation(cap, pose, mpDraw, mpPose, choice, reps, recorder=None, roi=None, skipper=None,
+                        metrics=None, smoother=None, publisher=None, results=None, policy=None):
+    detector = Detector(choice, reps)
+    policy = policy or RenderPolicy()
+
+    with PosePipeline(cap, pose, recorder=recorder, roi=roi, skipper=skipper, metrics=metrics,
+                      smoother=smoother) as pipeline:
+        # Newest frame and its pose results from the capture/inference stages
+        frames = streams.from_pipeline(pipeline)
+        frames = streams.render(frames, policy)
+        frames = streams.draw_landmarks(frames, mpDraw, mpPose, metrics)
+        frames = streams.detect(frames, detector, mpPose, metrics)
+        # Published and stored reps are the detector's, so they always match the ones on screen
+        if publisher is not None:
+            publisher.follow(detector.counter)
+            frames = streams.record(frames, publisher)
+        if results is not None:
+            results.follow(detector.counter)
+            frames = streams.record(frames, results)
+
+        try:
+            for frame in frames:
+                if detector.complete():
+                    print(detector.completion_message())
+                    if policy.enabled:
+                        img = frame.image if frame.render else policy.prepare(frame.image)
+                        policy.overlay("reps").draw(img, detector.lines())
+                        policy.overlay("complete", origin=(10, 110)).draw(img, [detector.completion_message()])
+                        cv2.imshow("Pose Estimation", img)
+                        cv2.waitKey(2000)
+
+                    return True
+
+                if not frame.render:
+                    continue
+
+                # Display rep counts on the image, redrawn only when they change
+                img = frame.image
+                policy.overlay("reps").draw(img, detector.lines())
+
+                # Show the frame
+                if metrics is not None and metrics.overlay:
+                    metrics.draw_overlay(img)
+                pipeline.draw_stats(img)
+                cv2.imshow("Pose Estimation", img)
+                pipeline.rendered(frame.read_at, frame.timestamp)
+
+                # Exit if 'q' is pressed
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    break
+        except Exception as e:
+            print(f"Error: {e}")
+
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Workout Tracker")
+    parser.add_argument("--record", metavar="DIR",
+                        help="Save the pose landmarks of every set as a trace file in DIR for later replay")
+    parser.add_argument("--roi", action="store_true",
+                        help="Run pose inference on a crop around the person instead of the full frame")
+    parser.add_argument("--adaptive-skip", action="store_true",
+                        help="Skip pose inference on some frames when it cannot keep up with the camera")
+    parser.add_argument("--smooth", action="store_true",
+                        help="Smooth the landmarks over time so jitter near a threshold cannot double count")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="Stream joint angles and rep events over WebSocket at ws://127.0.0.1:PORT/sessions/main")
+    parser.add_argument("--store", metavar="DB",
+                        help="Save every set, its reps and its joint angles to the SQLite database DB")
+    parser.add_argument("--user", default=getpass.getuser(), help="User the sets are stored for")
+    add_render_arguments(parser)
+    add_metrics_arguments(parser)
+    add_quality_arguments(parser)
+    args = parser.parse_args()
+    metrics, exporters = metrics_from_args(args)
+    server = EventServer(args.serve) if args.serve else None
+    store = ResultsStore(args.store) if args.store else None
+    session_id = store.start_session(args.user, "camera 0") if store else None
+
+    # Load the pose model and open the camera while the user picks an exercise
+    service = PoseService(metrics=metrics, **quality_from_args(args)).start()
+    startup_reported = False
+
+    while True:
+        try:
+            # Get user input for exercise choice and reps
+            choice, reps = get_user_input()
+
+            # Reuse the warm MediaPipe Pose model and open webcam
+            if not service.ready:
+                print("Loading the pose model...")
+            mpDraw, mpPose, pose, cap = service.acquire()
+            if not cap.isOpened():
+                print("Error: Camera could not be opened.")
+                exit()
+
+            recorder = None
+            if args.record:
+                os.makedirs(args.record, exist_ok=True)
+                recorder = TraceWriter(os.path.join(
+                    args.record, f"set_{time.strftime('%Y%m%d_%H%M%S')}_choice{choice}.trace"))
+
+            # Run pose estimation
+            roi = RoiTracker() if args.roi else None
+            skipper = FrameSkipper(CHOICES[choice]) if args.adaptive_skip else None
+            smoother = LandmarkFilter() if args.smooth else None
+            publisher = RepPublisher(server, "main", CHOICES[choice], reps) if server else None
+            results = SetRecorder(store, session_id, CHOICES[choice], reps) if store else None
+            try:
+                completed = run_pose_estimation(cap, pose, mpDraw, mpPose, choice, reps, recorder, roi, skipper,
+                                                metrics, smoother, publisher, results, render_policy_from_args(args))
+            finally:
+                service.release()  # The next set can take the model and camera
+            if results is not None:
+                results.close(completed)
+            if recorder is not None:
+                recorder.close()
+                print(f"Saved {recorder.frames} frames of landmarks to {recorder.path}")
+            if not startup_reported:
+                print(f"Startup: {service.report()}")
+                startup_reported = True
+
+            if completed:
+                print("Would you like to do another set?")
+                continue_input = input("Enter 'y' to continue or any other key to quit: ").strip().lower()
+                if continue_input != 'y':
+                    break  # Exit the loop if user does not want to continue
+        except Exception as e:
+            print(f"Error: {e}")
+            break
+        cv2.destroyAllWindows()
+
+    service.close()
+    if server is not None:
+        server.stop()
+    if store is not None:
+        store.close()
+    stop_exporters(exporters)
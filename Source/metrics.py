@@ -0,0 +1,231 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from render import TextOverlay
+
+# Histogram bucket upper bounds in ms, log-spaced from 0.05 ms to 10 s
+BUCKETS_MS = np.geomspace(0.05, 10000, 60).tolist()
+
+
+class Histogram:
+    """Latency histogram over a rolling window of the last one to two `window` seconds."""
+
+    def __init__(self, window=10.0):
+        self.window = window
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.previous = [0] * (len(BUCKETS_MS) + 1)
+        self.window_start = time.monotonic()
+        self.total = 0
+        self.total_ms = 0.0
+
+    def record(self, ms):
+        now = time.monotonic()
+        if now - self.window_start > self.window:
+            self.previous = self.counts
+            self.counts = [0] * len(self.previous)
+            self.window_start = now
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.total_ms += ms
+
+    def percentile(self, q):
+        counts = [a + b for a, b in zip(self.counts, self.previous)]
+        target = sum(counts) * q / 100
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if count and seen >= target:
+                return BUCKETS_MS[min(bucket, len(BUCKETS_MS) - 1)]
+        return 0.0
+
+    def snapshot(self):
+        return {
+            "count": self.total,
+            "mean_ms": self.total_ms / self.total if self.total else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+        }
+
+
+class Metrics:
+    """Opt-in hot-path metrics: stage latency histograms, counters and landmark confidence.
+
+    Recording costs a lock and a bisect, so it can stay on in production.
+    Histogram percentiles are bucket upper bounds (about 20% resolution).
+    overlay says whether draw_overlay() shows them on the frame; logging and
+    the HTTP export do not need it.
+    """
+
+    def __init__(self, window=10.0, overlay=False, overlay_interval=0.5):
+        self.window = window
+        self.overlay = overlay
+        self.overlay_interval = overlay_interval
+        self.overlay_lines = None
+        self.overlay_updated = None
+        self.text = None
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.confidence_frames = 0
+        self.confidence_mean = 0.0
+        self.confidence_min = 1.0
+        self.start_time = time.time()
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.window)
+            histogram.record(seconds * 1000)
+
+    @contextmanager
+    def time(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_counter(self, name, value):
+        with self.lock:
+            self.counters[name] = value
+
+    def observe_landmarks(self, results):
+        """Track the mean landmark visibility of each frame, and frames without a pose."""
+        if not results.pose_landmarks:
+            self.increment("frames_without_pose")
+            return
+        landmarks = results.pose_landmarks.landmark
+        visibility = sum(lm.visibility for lm in landmarks) / len(landmarks)
+        with self.lock:
+            self.confidence_frames += 1
+            self.confidence_mean += (visibility - self.confidence_mean) / min(self.confidence_frames, 100)
+            self.confidence_min = min(self.confidence_min, visibility)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "time": time.time(),
+                "uptime_s": time.time() - self.start_time,
+                "latency": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+                "counters": dict(self.counters),
+                "landmark_confidence": {
+                    "frames": self.confidence_frames,
+                    "recent_mean": self.confidence_mean,
+                    "min": self.confidence_min if self.confidence_frames else None,
+                },
+            }
+
+    def draw_overlay(self, img):
+        """Draw p50/p95 latencies, counters and landmark confidence in the top-right corner.
+
+        The lines are refreshed from a snapshot every overlay_interval seconds
+        and drawn from a cached render.TextOverlay in between, so the frame
+        loop does not pay for a snapshot and a putText per line every frame.
+        """
+        if not self.overlay:
+            return
+        now = time.monotonic()
+        if self.overlay_updated is None or now - self.overlay_updated >= self.overlay_interval:
+            snapshot = self.snapshot()
+            lines = [f"{name}: p50 {stats['p50_ms']:.1f} p95 {stats['p95_ms']:.1f} ms"
+                     for name, stats in snapshot["latency"].items()]
+            lines += [f"{name}: {value}" for name, value in snapshot["counters"].items()]
+            lines.append(f"confidence: {snapshot['landmark_confidence']['recent_mean']:.2f}")
+            self.overlay_lines = lines
+            self.overlay_updated = now
+
+        x = max(img.shape[1] - 330, 0)
+        if self.text is None or self.text.origin[0] != x:
+            self.text = TextOverlay((x, 20), line_height=18, scale=0.45, color=(0, 255, 255), thickness=1)
+        self.text.draw(img, self.overlay_lines)
+
+
+class MetricsLogger:
+    """Append a JSON snapshot of the metrics to a log file every `interval` seconds."""
+
+    def __init__(self, metrics, path, interval=5.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics logger", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(self.metrics.snapshot()) + "\n")
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.write()
+
+
+class MetricsServer:
+    """Serve the metrics snapshot as JSON at http://host:port/metrics on a background thread."""
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the console
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics server", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics", action="store_true", help="Collect hot-path metrics and show them on the frame")
+    parser.add_argument("--metrics-log", metavar="FILE", help="Append a JSON metrics snapshot to FILE every 5 s")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve metrics as JSON at http://127.0.0.1:PORT/metrics")
+
+
+def metrics_from_args(args):
+    """Return (metrics, exporters) for the parsed add_metrics_arguments options; metrics is None when disabled."""
+    if not (args.metrics or args.metrics_log or args.metrics_port):
+        return None, []
+    metrics = Metrics(overlay=args.metrics)
+    exporters = []
+    if args.metrics_log:
+        exporters.append(MetricsLogger(metrics, args.metrics_log))
+    if args.metrics_port:
+        exporters.append(MetricsServer(metrics, args.metrics_port))
+    return metrics, exporters
+
+
+def stop_exporters(exporters):
+    for exporter in exporters:
+        exporter.stop()
@@ -0,0 +1,241 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from exercises import CHOICES, RepCounter
+from kinematics import NUM_LANDMARKS, fill_landmarks, joint_angles
+from roi import RoiTracker
+
+TRACK_COLORS = [(0, 255, 0), (255, 128, 0), (0, 128, 255), (255, 0, 255), (0, 255, 255), (255, 255, 0)]
+
+
+class PersonDetector:
+    """OpenCV's HOG people detector, run on a downscaled frame.
+
+    Any object with a detect(img) method returning (n, 4) x0, y0, x1, y1 boxes
+    in full-frame pixels can take its place, e.g. a DNN person detector.
+    """
+
+    def __init__(self, scale=0.5, min_weight=0.3):
+        self.scale = scale
+        self.min_weight = min_weight
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def detect(self, img):
+        small = cv2.resize(img, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        rects, weights = self.hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0:
+            return np.zeros((0, 4))
+        rects = np.asarray(rects, dtype=float)[np.ravel(weights) >= self.min_weight] / self.scale
+        return np.column_stack([rects[:, 0], rects[:, 1], rects[:, 0] + rects[:, 2], rects[:, 1] + rects[:, 3]])
+
+
+def iou_matrix(a, b):
+    """Intersection over union of every box in a (n, 4) against every box in b (m, 4)."""
+    a = np.asarray(a, dtype=float).reshape(-1, 1, 4)
+    b = np.asarray(b, dtype=float).reshape(1, -1, 4)
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-9)
+
+
+def assign(track_boxes, detections, min_iou=0.3):
+    """Greedily match tracks to detections by descending IoU.
+
+    Returns (matches, unmatched_detections) where matches is a list of
+    (track index, detection index). Greedy matching is as good as the
+    Hungarian algorithm for the few, mostly separated people of a class.
+    """
+    if len(track_boxes) == 0 or len(detections) == 0:
+        return [], list(range(len(detections)))
+    iou = iou_matrix(track_boxes, detections)
+    matches = []
+    used_tracks, used_detections = set(), set()
+    for flat in np.argsort(iou, axis=None)[::-1]:
+        t, d = np.unravel_index(flat, iou.shape)
+        if iou[t, d] < min_iou:
+            break
+        if t not in used_tracks and d not in used_detections:
+            matches.append((int(t), int(d)))
+            used_tracks.add(t)
+            used_detections.add(d)
+    return matches, [d for d in range(len(detections)) if d not in used_detections]
+
+
+class Track:
+    """One person: a stable ID, a pose model and crop of their own, and a row of the rep counter."""
+
+    def __init__(self, track_id, slot, pose, box, input_size):
+        self.track_id = track_id
+        self.slot = slot
+        self.pose = pose
+        self.roi = RoiTracker(input_size=input_size, full_frame=False)
+        self.roi.box = box
+        self.last_box = box  # Where the person was last seen, to pick them up again after a lost crop
+        self.results = None
+        self.misses = 0
+
+
+class MultiPersonTracker:
+    """Count reps for several people in one camera view, each with their own rep state.
+
+    People are detected every detect_every frames (and whenever a track has
+    lost its crop), and matched to the existing tracks by box overlap. In
+    between, each track's crop follows its own landmarks, as with
+    roi.RoiTracker. The crops of all tracks are inferred together on a thread
+    pool, one Pose per track slot since a Pose keeps tracking state, and the
+    rep counters of all people advance in one vectorized RepCounter update.
+    A track missing for max_misses frames is dropped and its slot reused,
+    with the slot's Pose reset so it does not follow the previous person.
+    """
+
+    def __init__(self, exercise_names, pose_factory, max_people=4, detect_every=5, detector=None, max_misses=15,
+                 min_iou=0.3, input_size=256):
+        self.max_people = max_people
+        self.detect_every = detect_every
+        self.detector = detector or PersonDetector()
+        self.max_misses = max_misses
+        self.min_iou = min_iou
+        self.input_size = input_size
+        self.counter = RepCounter(exercise_names, people=max_people)
+        self.pose_factory = pose_factory
+        self.poses = [pose_factory() for _ in range(max_people)]
+        self.used_slots = set()  # Slots whose Pose has tracked someone
+        self.executor = ThreadPoolExecutor(max_people)
+        self.landmarks = np.full((max_people, NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+        self.tracks = []
+        self.next_id = 0
+        self.frame_index = 0
+
+    def _detect(self, img):
+        height, width = img.shape[:2]
+        detections = self.detector.detect(img)
+        boxes = [track.last_box for track in self.tracks]
+        matches, unmatched = assign(boxes, detections, self.min_iou)
+        for t, d in matches:
+            track = self.tracks[t]
+            # Pick up a lost crop, or move back onto the person when the crop has drifted off them
+            if track.roi.box is None or iou_matrix([track.roi.box], detections[d:d + 1])[0, 0] < 0.5:
+                track.roi.box = self._clip(detections[d], width, height)
+
+        used = {track.slot for track in self.tracks}
+        free = [slot for slot in range(self.max_people) if slot not in used]
+        for d in unmatched:
+            # A new person, unless they overlap someone already tracked
+            if not free or (boxes and iou_matrix(boxes, detections[d:d + 1]).max() >= self.min_iou):
+                continue
+            slot = free.pop(0)
+            if slot in self.used_slots:
+                self._reset_pose(slot)
+            self.used_slots.add(slot)
+            self.counter.phase[slot] = self.counter.table.start_phase
+            self.counter.reps[slot] = 0
+            self.tracks.append(Track(self.next_id, slot, self.poses[slot], self._clip(detections[d], width, height),
+                                     self.input_size))
+            self.next_id += 1
+
+    def _reset_pose(self, slot):
+        """Clear the tracking state a slot's Pose kept from its previous person, rebuilding it without reset()."""
+        pose = self.poses[slot]
+        if hasattr(pose, "reset"):
+            pose.reset()
+            return
+        if hasattr(pose, "close"):
+            pose.close()
+        self.poses[slot] = self.pose_factory()
+
+    @staticmethod
+    def _clip(box, width, height):
+        x0, y0, x1, y1 = box
+        return int(max(x0, 0)), int(max(y0, 0)), int(min(x1, width)), int(min(y1, height))
+
+    def process(self, img):
+        """Track and count one BGR frame; returns (tracks, counted) with counted a (max_people, exercises) mask."""
+        if self.frame_index % self.detect_every == 0 or any(track.roi.box is None for track in self.tracks):
+            self._detect(img)
+        self.frame_index += 1
+
+        active = [track for track in self.tracks if track.roi.box is not None]
+        for track, results in zip(active, self.executor.map(lambda track: track.roi.process(track.pose, img),
+                                                             active)):
+            track.results = results
+
+        self.landmarks[:] = np.nan
+        for track in self.tracks:
+            if track in active and track.results.pose_landmarks:
+                track.misses = 0
+                track.last_box = track.roi.box or track.last_box
+                fill_landmarks(self.landmarks[track.slot], track.results)
+            else:
+                track.results = None
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        counted = self.counter.update(joint_angles(self.landmarks))
+        return self.tracks, counted
+
+    def reps(self, track):
+        return dict(zip(self.counter.table.names, self.counter.reps[track.slot].tolist()))
+
+    def close(self):
+        self.executor.shutdown()
+        for pose in self.poses:
+            if hasattr(pose, "close"):
+                pose.close()
+
+
+def draw_tracks(img, tracker, mpDraw=None, mpPose=None):
+    for track in tracker.tracks:
+        color = TRACK_COLORS[track.track_id % len(TRACK_COLORS)]
+        if track.roi.box is not None:
+            x0, y0, x1, y1 = track.roi.box
+            cv2.rectangle(img, (x0, y0), (x1, y1), color, 2)
+            reps = ", ".join(f"{name} {count}" for name, count in tracker.reps(track).items())
+            cv2.putText(img, f"#{track.track_id}: {reps}", (x0 + 5, y0 + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color,
+                        2, cv2.LINE_AA)
+        if mpDraw is not None and track.results is not None:
+            mpDraw.draw_landmarks(img, track.results.pose_landmarks, mpPose.POSE_CONNECTIONS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count reps for several people in one camera view.")
+    parser.add_argument("source", nargs="?", default="0", help="Camera index or video file (default: camera 0)")
+    parser.add_argument("--choice", type=int, choices=[1, 2, 3, 4], default=1,
+                        help="1: right arm curls, 2: left arm curls, 3: both arms curls, 4: squats")
+    parser.add_argument("--people", type=int, default=4, help="Most people tracked at once")
+    parser.add_argument("--detect-every", type=int, default=5, help="Frames between person detections")
+    args = parser.parse_args()
+
+    import mediapipe as mp
+    cap = cv2.VideoCapture(int(args.source) if args.source.isdigit() else args.source)
+    if not cap.isOpened():
+        print("Error: Camera could not be opened.")
+        return
+    tracker = MultiPersonTracker(CHOICES[args.choice], mp.solutions.pose.Pose, args.people, args.detect_every)
+    try:
+        while True:
+            success, img = cap.read()
+            if not success:
+                break
+            tracks, counted = tracker.process(img)
+            for track in tracks:
+                if counted[track.slot].any():
+                    print(f"Person #{track.track_id} reps: {tracker.reps(track)}")
+            draw_tracks(img, tracker, mp.solutions.drawing_utils, mp.solutions.pose)
+            cv2.imshow("Group Workout", img)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        tracker.close()
+        cap.release()
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
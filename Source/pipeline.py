@@ -0,0 +1,220 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class LatestQueue:
+    """Bounded queue that drops the oldest item when full, so readers always get the newest one."""
+
+    def __init__(self, maxsize=1):
+        self.items = deque(maxlen=maxsize)
+        self.cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+
+    def __len__(self):
+        with self.cond:
+            return len(self.items)
+
+    def get(self, timeout=None):
+        """Return the oldest queued item, raising queue.Empty if nothing arrives in time."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: len(self.items) > 0, timeout):
+                raise queue.Empty
+            return self.items.popleft()
+
+
+class StageStats:
+    """Smoothed latency (ms) and throughput (fps) of one pipeline stage.
+
+    With a metrics.Metrics instance, every latency also goes into its histogram.
+    """
+
+    def __init__(self, name, smoothing=0.9, metrics=None):
+        self.name = name
+        self.metrics = metrics
+        self.smoothing = smoothing
+        self.latency_ms = 0.0
+        self.interval = 0.0
+        self.count = 0
+        self.last_time = None
+
+    def record(self, start):
+        """Record one item that entered the stage at time.perf_counter() value `start`."""
+        now = time.perf_counter()
+        latency_ms = (now - start) * 1000
+        if self.metrics is not None:
+            self.metrics.observe(self.name, now - start)
+        if self.count == 0:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms = self.smoothing * self.latency_ms + (1 - self.smoothing) * latency_ms
+
+        if self.last_time is not None:
+            interval = now - self.last_time
+            if self.interval == 0:
+                self.interval = interval
+            else:
+                self.interval = self.smoothing * self.interval + (1 - self.smoothing) * interval
+
+        self.last_time = now
+        self.count += 1
+
+    @property
+    def fps(self):
+        return 1.0 / self.interval if self.interval > 0 else 0.0
+
+    def __str__(self):
+        return f"{self.name}: {self.fps:.1f} fps {self.latency_ms:.1f} ms"
+
+
+class PosePipeline:
+    """Capture and inference stages running on their own threads.
+
+    The capture thread keeps draining the camera so frames never pile up in the
+    driver buffer, the inference thread always runs pose.process on the newest
+    captured frame, and the caller's loop is the render stage, reading the newest
+    (img, results) pair with read(). If a landmark_trace.TraceWriter is given as
+    recorder, every inferred frame is recorded, including those the render stage
+    skips. With a roi.RoiTracker, inference runs on a crop around the person,
+    and with a frame_skip.FrameSkipper, frames it decides to skip get predicted
+    landmarks instead of an inference; the queues then hold the frames
+    captured during an inference instead of dropping them. A smoothing.LandmarkFilter as smoother
+    smooths the landmarks over time before they reach the detectors; traces
+    are recorded before smoothing. A metrics.Metrics instance collects stage
+    latency histograms, dropped frames and landmark confidence.
+    """
+
+    def __init__(self, cap, pose, queue_size=1, recorder=None, roi=None, skipper=None, metrics=None,
+                 smoother=None):
+        self.cap = cap
+        self.pose = pose
+        self.recorder = recorder
+        self.roi = roi
+        self.skipper = skipper
+        self.smoother = smoother
+        self.metrics = metrics
+        if skipper is not None:
+            queue_size = max(queue_size, skipper.queue_size)  # Frames captured during an inference get predictions
+        self.frames = LatestQueue(queue_size)
+        self.results = LatestQueue(queue_size)
+
+        self.capture_stats = StageStats("capture", metrics=metrics)
+        self.inference_stats = StageStats("inference", metrics=metrics)
+        self.render_stats = StageStats("render", metrics=metrics)
+        self.latency_stats = StageStats("end-to-end", metrics=metrics)
+
+        self.running = False
+        self.threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """Stop both stages and wait for them to exit, so the camera and model are free for the next user.
+
+        Each loop checks running between frames, so this waits for at most one
+        cap.read() and one inference.
+        """
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _capture_loop(self):
+        try:
+            while self.running:
+                start = time.perf_counter()
+                success, img = self.cap.read()
+                if not success:
+                    break
+                self.capture_stats.record(start)
+                if self.skipper is not None:
+                    self.skipper.observe_frame(start)
+                self.frames.put((img, start))
+        except Exception as e:
+            print(f"Error in capture stage: {e}")
+        self.frames.put(None)  # End of stream
+
+    def _inference_loop(self):
+        try:
+            while self.running:
+                try:
+                    item = self.frames.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    break
+
+                img, captured_at = item
+                start = time.perf_counter()
+                if self.skipper is not None and not self.skipper.should_infer(captured_at):
+                    results = self.skipper.predict(captured_at)
+                    if self.metrics is not None:
+                        self.metrics.increment("predicted_frames")
+                else:
+                    if self.roi is not None:
+                        results = self.roi.process(self.pose, img)
+                    else:
+                        imageRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+                        results = self.pose.process(imageRGB)
+                    if self.skipper is not None:
+                        self.skipper.observe(results, captured_at, time.perf_counter() - start)
+                self.inference_stats.record(start)
+                if self.metrics is not None:
+                    self.metrics.observe_landmarks(results)
+                if self.recorder is not None:
+                    self.recorder.write(results, captured_at)
+                if self.smoother is not None:
+                    self.smoother.apply(results, captured_at)
+                self.results.put((img, results, captured_at))
+        except Exception as e:
+            print(f"Error in inference stage: {e}")
+        self.results.put(None)  # End of stream
+
+    def read(self, timeout=None):
+        """Return the newest (img, results, captured_at), or None once the source is exhausted.
+
+        Raises queue.Empty if no result arrives within `timeout` seconds.
+        """
+        return self.results.get(timeout)
+
+    def rendered(self, start, captured_at):
+        """Record that the frame captured at `captured_at` finished rendering."""
+        self.render_stats.record(start)
+        self.latency_stats.record(captured_at)
+        if self.metrics is not None:
+            self.metrics.set_counter("dropped_before_inference", self.frames.dropped)
+            self.metrics.set_counter("dropped_before_render", self.results.dropped)
+
+    def stats(self):
+        return [self.capture_stats, self.inference_stats, self.render_stats, self.latency_stats]
+
+    def draw_stats(self, img):
+        """Draw per-stage fps and latency in the bottom-left corner of the frame."""
+        y = img.shape[0] - 10
+        for stage in reversed(self.stats()):
+            cv2.putText(img, str(stage), (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+            y -= 20
@@ -0,0 +1,196 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from quality import PROFILES, QualityGovernor, autotune, get_profile, pose_options, scale_input
+
+# Size of the blank frame used to initialize the pose graph before the first set
+WARMUP_SIZE = (256, 256)
+# Camera frames the quality auto-tuner measures each profile on
+TUNING_FRAMES = 10
+
+
+class PoseService:
+    """The MediaPipe Pose model and the camera, loaded once and shared by every set.
+
+    start() imports MediaPipe, builds the Pose graph and runs it once on a blank
+    frame on one background thread while another opens the camera, so the menu
+    or window is usable while they load. Each set calls acquire() to get the
+    warm (mpDraw, mpPose, pose, cap) instead of building them again, and
+    release() when it ends; only one set at a time can hold them.
+
+    The returned pose is the service itself: process() forwards to the Pose
+    model and records the time to the first detected landmarks. Startup
+    milestones, in seconds since the service was created, are kept in
+    `timings` and set as startup_*_ms counters on the optional metrics.
+
+    quality names a quality.PROFILES entry for the model and its input size,
+    or is "auto" to measure the profiles on a few camera frames and keep the
+    most accurate one that reaches target_fps. With latency_slo_ms, a
+    QualityGovernor steps down to cheaper profiles while the sets run; the
+    cheaper Pose is built in the background and swapped in between frames.
+    Without quality, the model keeps the Pose() defaults at full input size.
+    """
+
+    def __init__(self, camera=0, pose_options=None, metrics=None, quality=None, target_fps=15.0,
+                 latency_slo_ms=None):
+        self.camera = camera
+        self.pose_options = pose_options or {}
+        self.metrics = metrics
+        self.quality = quality
+        self.target_fps = target_fps
+        self.latency_slo_ms = latency_slo_ms
+        self.profile = None
+        self.governor = None
+        self.tuning = {}
+        self.pending = None  # (profile, pose) built for a step down, swapped in by process()
+        self.stepping_down = False  # From a step down until its pose is swapped in
+        self.lease = threading.Lock()  # Held by the set using the model and camera
+        self.created_at = time.perf_counter()
+        self.timings = {}
+        self.mpDraw = None
+        self.mpPose = None
+        self.pose = None
+        self.cap = None
+        self.error = None
+        self.model_ready = threading.Event()
+        self.camera_ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._load_model, name="pose model", daemon=True).start()
+        threading.Thread(target=self._open_camera, name="camera", daemon=True).start()
+        return self
+
+    def mark(self, name):
+        """Record that startup milestone `name` was reached now."""
+        if name in self.timings:
+            return
+        elapsed = time.perf_counter() - self.created_at
+        self.timings[name] = elapsed
+        if self.metrics is not None:
+            self.metrics.set_counter(f"startup_{name}_ms", round(elapsed * 1000))
+
+    def _load_model(self):
+        try:
+            import mediapipe as mp  # Imported here, it alone takes seconds
+            self.mark("import")
+            self.mpDraw = mp.solutions.drawing_utils
+            self.mpPose = mp.solutions.pose
+            if self.quality == "auto":
+                self.profile, self.pose, self.tuning = autotune(self._make_pose, self._tuning_frames(),
+                                                                self.target_fps)
+            else:
+                if self.quality is not None:
+                    self.profile = get_profile(self.quality)
+                self.pose = self._make_pose(self.profile)
+                # The first process() call initializes the graph; pay for it before the first set
+                self.pose.process(np.zeros((WARMUP_SIZE[1], WARMUP_SIZE[0], 3), dtype=np.uint8))
+            if self.latency_slo_ms is not None:
+                self.governor = QualityGovernor(self.profile, self.latency_slo_ms)
+            self._set_profile_counter()
+            self.mark("model")
+        except Exception as e:
+            self.error = e
+        self.model_ready.set()
+
+    def _make_pose(self, profile):
+        if profile is None:
+            return self.mpPose.Pose(**self.pose_options)
+        return self.mpPose.Pose(**{**self.pose_options, **pose_options(profile)})
+
+    def _tuning_frames(self):
+        """A few RGB camera frames to measure the profiles on; blank frames if the camera gives none."""
+        self.camera_ready.wait()
+        frames = []
+        while self.cap.isOpened() and len(frames) < TUNING_FRAMES:
+            success, img = self.cap.read()
+            if not success:
+                break
+            frames.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        return frames or [np.zeros((480, 640, 3), dtype=np.uint8)] * TUNING_FRAMES
+
+    def _set_profile_counter(self):
+        if self.metrics is not None and self.profile is not None:
+            self.metrics.set_counter("quality_level", PROFILES.index(self.profile))
+
+    def _step_down(self, profile):
+        def load():
+            try:
+                self.pending = (profile, self._make_pose(profile))
+            except Exception as e:
+                print(f"Error loading the {profile.name} profile: {e}")
+                self.stepping_down = False
+
+        self.stepping_down = True  # No further step until this one is swapped in, so no built pose is lost
+        print(f"Inference too slow for the {self.latency_slo_ms:g} ms SLO, switching to the {profile.name} profile")
+        threading.Thread(target=load, name="pose model", daemon=True).start()
+
+    def _open_camera(self):
+        self.cap = cv2.VideoCapture(self.camera)
+        self.mark("camera")
+        self.camera_ready.set()
+
+    @property
+    def ready(self):
+        return self.model_ready.is_set() and self.camera_ready.is_set()
+
+    def acquire(self, timeout=None):
+        """Wait for the model and camera and return (mpDraw, mpPose, pose, cap) for one set.
+
+        Raises the error that stopped the model from loading, TimeoutError if
+        loading takes longer than `timeout` seconds, and RuntimeError while
+        another set holds them; call release() when the set ends. A camera
+        released since the last set is reopened; check cap.isOpened() as usual.
+        """
+        if not (self.model_ready.wait(timeout) and self.camera_ready.wait(timeout)):
+            raise TimeoutError("Pose model or camera still loading")
+        if self.error is not None:
+            raise self.error
+        if not self.lease.acquire(blocking=False):
+            raise RuntimeError("Another set is using the pose model and camera")
+        if not self.cap.isOpened():
+            self.cap.open(self.camera)
+        return self.mpDraw, self.mpPose, self, self.cap
+
+    def release(self):
+        """End the set that acquire() started, so the next one can take the model and camera."""
+        self.lease.release()
+
+    def process(self, image):
+        if self.pending is not None:
+            previous = self.pose
+            self.profile, self.pose = self.pending
+            self.pending = None
+            self.stepping_down = False
+            previous.close()
+            self._set_profile_counter()
+
+        start = time.perf_counter()
+        results = self.pose.process(scale_input(image, self.profile))
+        if self.governor is not None and not self.stepping_down:
+            lower = self.governor.observe(time.perf_counter() - start)
+            if lower is not None:
+                self._step_down(lower)
+        if results.pose_landmarks and "first_landmark" not in self.timings:
+            self.mark("first_landmark")
+        return results
+
+    def report(self):
+        report = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in
+                           sorted(self.timings.items(), key=lambda item: item[1]))
+        if self.tuning:
+            report += ", tuning " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in self.tuning.items())
+        if self.profile is not None:
+            report += f", quality {self.profile.name}"
+        return report
+
+    def close(self):
+        self.model_ready.wait()
+        self.camera_ready.wait()
+        if self.pose is not None:
+            self.pose.close()
+        if self.pending is not None:
+            self.pending[1].close()
+        self.cap.release()
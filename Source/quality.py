@@ -0,0 +1,129 @@
+import time
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+
+# scale is the percentage of the frame size given to the model. A lower tracking
+# confidence keeps following the person of the previous frame instead of running
+# the person detector again, which is the cheaper path.
+QualityProfile = namedtuple("QualityProfile", ["name", "model_complexity", "scale", "min_detection_confidence",
+                                               "min_tracking_confidence"])
+
+# Most accurate first; "balanced" is what Pose() and rescale_frame() do by default
+PROFILES = [
+    QualityProfile("accurate", 2, 100, 0.5, 0.5),
+    QualityProfile("balanced", 1, 75, 0.5, 0.5),
+    QualityProfile("fast", 0, 50, 0.5, 0.4),
+    QualityProfile("minimal", 0, 35, 0.6, 0.3),
+]
+PROFILE_NAMES = [profile.name for profile in PROFILES]
+
+
+def get_profile(name):
+    for profile in PROFILES:
+        if profile.name == name:
+            return profile
+    raise ValueError(f"Unknown quality profile {name!r}, expected one of {', '.join(PROFILE_NAMES)}")
+
+
+def pose_options(profile):
+    """Keyword arguments for mp.solutions.pose.Pose() of a profile."""
+    return {
+        "model_complexity": profile.model_complexity,
+        "min_detection_confidence": profile.min_detection_confidence,
+        "min_tracking_confidence": profile.min_tracking_confidence,
+    }
+
+
+def scale_input(img, profile):
+    """Shrink the model input to the profile's scale; landmarks are normalized, so callers see no difference."""
+    if profile is None or profile.scale >= 100:
+        return img
+    return cv2.resize(img, None, fx=profile.scale / 100, fy=profile.scale / 100, interpolation=cv2.INTER_AREA)
+
+
+def measure(pose, profile, frames, warmup=2):
+    """Median milliseconds of pose.process on the RGB frames at the profile's scale, after warmup calls."""
+    inputs = [scale_input(frame, profile) for frame in frames]
+    for img in inputs[:warmup]:
+        pose.process(img)
+    durations = []
+    for img in inputs:
+        start = time.perf_counter()
+        pose.process(img)
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations)) * 1000
+
+
+def autotune(pose_factory, frames, target_fps, profiles=PROFILES):
+    """Pick the most accurate profile whose inference keeps up with target_fps on this host.
+
+    pose_factory(profile) builds a Pose for a profile. Profiles are tried
+    from most to least accurate, and the first fast enough is kept, so a fast
+    host only pays for one measurement. Returns (profile, pose, timings) with
+    timings the measured milliseconds per profile; when none is fast enough,
+    the least accurate one is returned.
+    """
+    budget_ms = 1000 / target_fps
+    timings = {}
+    pose = None
+    for profile in profiles:
+        if pose is not None:
+            pose.close()
+        pose = pose_factory(profile)
+        timings[profile.name] = measure(pose, profile, frames)
+        if timings[profile.name] <= budget_ms:
+            break
+    return profile, pose, timings
+
+
+class QualityGovernor:
+    """Step down to a cheaper profile when inference latency breaks its SLO at runtime.
+
+    observe() takes the duration of each inference. Once a full window of
+    frames has a p95 above slo_ms, it returns the next profile in PROFILES
+    order and starts a new window, so a single slow frame or the switch itself
+    cannot trigger another step. It never steps up again: a host that was too
+    slow once (thermal throttling, other sessions) is likely to be again.
+    A profile of None stands for the Pose() defaults at full input size,
+    from which the first step is "balanced".
+    """
+
+    def __init__(self, profile, slo_ms, window=60, profiles=PROFILES):
+        self.profiles = list(profiles)
+        self.profile = profile
+        self.slo_ms = slo_ms
+        self.durations = deque(maxlen=window)
+        self.steps = 0
+
+    def observe(self, seconds):
+        self.durations.append(seconds * 1000)
+        if len(self.durations) < self.durations.maxlen:
+            return None
+        if np.percentile(self.durations, 95) <= self.slo_ms:
+            return None
+        self.durations.clear()
+        if self.profile is None:
+            level = [profile.name for profile in self.profiles].index("balanced") - 1
+        else:
+            level = self.profiles.index(self.profile)
+        if level + 1 >= len(self.profiles):
+            return None  # Already at the cheapest profile
+        self.profile = self.profiles[level + 1]
+        self.steps += 1
+        return self.profile
+
+
+def add_quality_arguments(parser):
+    parser.add_argument("--quality", choices=["auto"] + PROFILE_NAMES,
+                        help="Pose model quality profile; 'auto' benchmarks this host at startup to pick one")
+    parser.add_argument("--target-fps", type=float, default=15.0,
+                        help="Inference frame rate --quality auto must reach (default: 15)")
+    parser.add_argument("--latency-slo", type=float, metavar="MS",
+                        help="Step down to a cheaper profile when the p95 inference time exceeds MS")
+
+
+def quality_from_args(args):
+    """PoseService keyword arguments for the parsed add_quality_arguments options."""
+    return {"quality": args.quality, "target_fps": args.target_fps, "latency_slo_ms": args.latency_slo}
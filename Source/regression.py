@@ -0,0 +1,234 @@
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+
+from exercises import CHOICES
+from landmark_trace import load_trace, save_trace
+from streams import Detector
+from synthetic import synthetic_trace
+
+
+def annotation_path(trace_path):
+    """Where the ground truth of a trace is kept: next to it, with .reps.json for its extension."""
+    return os.path.splitext(trace_path)[0] + ".reps.json"
+
+
+def save_annotations(trace_path, choice, rep_times, **info):
+    """Store the ground-truth reps of a trace of exercise choice 1-4 next to it.
+
+    rep_times maps each exercise of the choice to the seconds (trace time)
+    of its reps, e.g. {"squats": [1.0, 3.1, 5.0]}; info is kept as is, e.g.
+    camera="side". The file is plain JSON, so recorded traces can be
+    annotated by hand.
+    """
+    annotations = {"choice": choice,
+                   "reps": {name: [round(float(t), 4) for t in times] for name, times in rep_times.items()}, **info}
+    with open(annotation_path(trace_path), "w") as f:
+        json.dump(annotations, f, indent=2)
+
+
+def load_annotations(trace_path):
+    with open(annotation_path(trace_path)) as f:
+        return json.load(f)
+
+
+def find_traces(paths):
+    """The annotated traces among paths, which may be trace files or directories of them."""
+    traces = []
+    for path in paths:
+        candidates = sorted(glob.glob(os.path.join(path, "*.trace"))) if os.path.isdir(path) else [path]
+        traces += [trace for trace in candidates if os.path.exists(annotation_path(trace))]
+    return traces
+
+
+def generate_corpus(directory, reps=10, periods=(1.5, 2.5, 4.0), noises=(0.002, 0.01), fps=30.0):
+    """Write synthetic traces of every exercise choice, with their ground truth, for a baseline corpus."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for choice in CHOICES:
+        for period in periods:
+            for seed, noise in enumerate(noises):
+                landmarks, timestamps, rep_times = synthetic_trace(choice, reps, fps, period, noise, seed)
+                path = os.path.join(directory, f"synthetic_choice{choice}_{period:g}s_noise{noise:g}.trace")
+                save_trace(path, landmarks, timestamps)
+                save_annotations(path, choice, {name: rep_times for name in CHOICES[choice]},
+                                 source="synthetic", camera="front", period=period, noise=noise)
+                paths.append(path)
+    return paths
+
+
+def replay_counts(landmarks, timestamps, choice):
+    """Replay a trace through a Detector; returns ({exercise: [seconds of each counted rep]}, replay seconds)."""
+    detector = Detector(choice, 0)
+    names = detector.counter.table.names
+    counted = {name: [] for name in names}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # The detectors print every rep
+        start = time.perf_counter()
+        for frame, timestamp in zip(landmarks, timestamps):
+            detector.update_array(frame)
+            for name, reps in zip(names, detector.counter.reps[0].tolist()):
+                if reps != len(counted[name]):
+                    counted[name].append(float(timestamp))
+        elapsed = time.perf_counter() - start
+    return counted, elapsed
+
+
+def match_reps(expected, counted, tolerance):
+    """Pair the expected and counted rep times in order; a rep more than tolerance seconds away is unmatched.
+
+    Returns the counted minus expected seconds of each matched pair.
+    """
+    errors = []
+    i = j = 0
+    while i < len(expected) and j < len(counted):
+        error = counted[j] - expected[i]
+        if abs(error) <= tolerance:
+            errors.append(error)
+            i += 1
+            j += 1
+        elif error < 0:
+            j += 1  # Counted a rep that is not there
+        else:
+            i += 1  # Missed a rep
+    return errors
+
+
+def evaluate_trace(path, tolerance=1.0, repeat=3):
+    """Replay one annotated trace repeat times and compare its counts with the ground truth."""
+    annotations = load_annotations(path)
+    trace = load_trace(path)
+    landmarks = trace["landmarks"]
+    timestamps = trace["timestamp"].tolist()
+    best = None
+    for _ in range(repeat):
+        counted, elapsed = replay_counts(landmarks, timestamps, annotations["choice"])
+        best = elapsed if best is None else min(best, elapsed)
+
+    exercises = {}
+    for name, expected in annotations["reps"].items():
+        exercises[name] = {
+            "expected": len(expected),
+            "counted": len(counted[name]),
+            "timing_errors": match_reps(expected, counted[name], tolerance),
+        }
+    return {
+        "trace": path,
+        "choice": annotations["choice"],
+        "frames": len(timestamps),
+        "duration_s": timestamps[-1] - timestamps[0] if timestamps else 0.0,
+        "replay_s": best,
+        "exercises": exercises,
+    }
+
+
+def summarize(traces):
+    """Count accuracy, timing error and replay throughput per exercise over evaluate_trace results."""
+    summary = {}
+    for result in traces:
+        for name, reps in result["exercises"].items():
+            stats = summary.setdefault(name, {"traces": 0, "exact": 0, "expected_reps": 0, "counted_reps": 0,
+                                              "matched_reps": 0, "timing_errors": [], "frames": 0,
+                                              "duration_s": 0.0, "replay_s": 0.0})
+            stats["traces"] += 1
+            stats["exact"] += reps["counted"] == reps["expected"]
+            stats["expected_reps"] += reps["expected"]
+            stats["counted_reps"] += reps["counted"]
+            stats["matched_reps"] += len(reps["timing_errors"])
+            stats["timing_errors"] += reps["timing_errors"]
+            stats["frames"] += result["frames"]
+            stats["duration_s"] += result["duration_s"]
+            stats["replay_s"] += result["replay_s"]
+
+    for stats in summary.values():
+        errors = stats.pop("timing_errors")
+        replay_s = stats.pop("replay_s")
+        stats["count_accuracy"] = stats["exact"] / stats["traces"]
+        stats["missed_reps"] = stats["expected_reps"] - stats["matched_reps"]
+        stats["extra_reps"] = stats["counted_reps"] - stats["matched_reps"]
+        stats["mean_timing_error_s"] = sum(errors) / len(errors) if errors else None
+        stats["mean_abs_timing_error_s"] = sum(map(abs, errors)) / len(errors) if errors else None
+        stats["max_abs_timing_error_s"] = max(map(abs, errors)) if errors else None
+        stats["frames_per_s"] = stats["frames"] / replay_s if replay_s > 0 else None
+        stats["times_realtime"] = stats["duration_s"] / replay_s if replay_s > 0 else None
+    return summary
+
+
+def run_regression(paths, tolerance=1.0, repeat=3):
+    traces = [evaluate_trace(path, tolerance, repeat) for path in find_traces(paths)]
+    return {"tolerance_s": tolerance, "exercises": summarize(traces), "traces": traces}
+
+
+def compare(baseline, current):
+    """Print the traces whose counts changed and the change in accuracy and throughput per exercise."""
+    before = {result["trace"]: result for result in baseline["traces"]}
+    for result in current["traces"]:
+        previous = before.get(result["trace"])
+        if previous is None:
+            continue
+        for name, reps in result["exercises"].items():
+            old = previous["exercises"].get(name)
+            if old and old["counted"] != reps["counted"]:
+                print(f"{result['trace']} {name}: {old['counted']} -> {reps['counted']} reps "
+                      f"(expected {reps['expected']})")
+    for name, stats in current["exercises"].items():
+        old = baseline["exercises"].get(name)
+        if old:
+            print(f"{name:12} accuracy {old['count_accuracy']:.3f} -> {stats['count_accuracy']:.3f}, "
+                  f"{old['frames_per_s']:.0f} -> {stats['frames_per_s']:.0f} frames/s")
+
+
+def print_summary(report):
+    print(f"{'exercise':12} {'traces':>6} {'accuracy':>8} {'missed':>6} {'extra':>5} {'mean err':>9} "
+          f"{'max err':>8} {'frames/s':>10} {'x realtime':>10}")
+    for name, stats in report["exercises"].items():
+        mean_error = stats["mean_abs_timing_error_s"]
+        max_error = stats["max_abs_timing_error_s"]
+        print(f"{name:12} {stats['traces']:6} {stats['count_accuracy']:8.3f} {stats['missed_reps']:6} "
+              f"{stats['extra_reps']:5} {'-' if mean_error is None else f'{mean_error:.3f}s':>9} "
+              f"{'-' if max_error is None else f'{max_error:.3f}s':>8} {stats['frames_per_s'] or 0:10.0f} "
+              f"{stats['times_realtime'] or 0:10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay annotated landmark traces through the rep detectors and check counts and timing.")
+    parser.add_argument("paths", nargs="+", help="Trace files or directories with <name>.reps.json next to them")
+    parser.add_argument("--generate", action="store_true",
+                        help="First write a synthetic corpus of every exercise into the (single) directory given")
+    parser.add_argument("--tolerance", type=float, default=1.0,
+                        help="Seconds a counted rep may be from its annotation and still match")
+    parser.add_argument("--repeat", type=int, default=3, help="Replays per trace; the fastest is reported")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare against an earlier JSON report")
+    parser.add_argument("--min-accuracy", type=float, default=1.0,
+                        help="Exit with status 1 when an exercise's count accuracy is lower (default: 1.0)")
+    args = parser.parse_args()
+
+    if args.generate:
+        if len(args.paths) != 1:
+            parser.error("--generate takes exactly one directory")
+        generate_corpus(args.paths[0])
+    report = run_regression(args.paths, args.tolerance, args.repeat)
+    if not report["traces"]:
+        parser.error("No annotated traces found")
+
+    print_summary(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+    failed = [name for name, stats in report["exercises"].items() if stats["count_accuracy"] < args.min_accuracy]
+    if failed:
+        print(f"Count accuracy below {args.min_accuracy} for {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+RENDER_MODES = ["none", "preview", "full"]
+
+
+class TextOverlay:
+    """Lines of text drawn once into a cached layer and pasted onto each frame until the lines change.
+
+    Drawing anti-aliased text is several putText calls per frame; the rep
+    counts it shows change a few times a set, so the layer is only redrawn
+    then and every other frame costs one masked copy, a tenth of a putText.
+    """
+
+    def __init__(self, origin=(10, 30), line_height=40, scale=1.0, color=(0, 255, 0), thickness=2,
+                 font=cv2.FONT_HERSHEY_SIMPLEX):
+        self.origin = origin
+        self.line_height = line_height
+        self.scale = scale
+        self.color = color
+        self.thickness = thickness
+        self.font = font
+        self.lines = None
+        self.layer = None
+        self.mask = None
+        self.top = 0
+        self.redraws = 0
+
+    def _redraw(self, lines):
+        sizes = [cv2.getTextSize(line, self.font, self.scale, self.thickness) for line in lines]
+        ascent = max([height for (_, height), _ in sizes] + [0])
+        descent = max([baseline for _, baseline in sizes] + [0]) + self.thickness
+        width = max([text_width for (text_width, _), _ in sizes] + [0]) + self.thickness
+        height = ascent + self.line_height * max(len(lines) - 1, 0) + descent
+        self.layer = np.zeros((height, max(width, 1), 3), dtype=np.uint8)
+        for i, line in enumerate(lines):
+            cv2.putText(self.layer, line, (0, ascent + self.line_height * i), self.font, self.scale, self.color,
+                        self.thickness, cv2.LINE_AA)
+        self.mask = self.layer.any(axis=2).astype(np.uint8)
+        self.lines = list(lines)
+        self.top = max(self.origin[1] - ascent, 0)  # origin is the baseline of the first line, as for putText
+        self.redraws += 1
+
+    def draw(self, img, lines):
+        if lines != self.lines:
+            self._redraw(lines)
+        x, y = self.origin[0], self.top
+        height = min(self.layer.shape[0], img.shape[0] - y)
+        width = min(self.layer.shape[1], img.shape[1] - x)
+        if height <= 0 or width <= 0:
+            return
+        cv2.copyTo(self.layer[:height, :width], self.mask[:height, :width], img[y:y + height, x:x + width])
+
+
+class RenderPolicy:
+    """Which frames get drawn, and at what size.
+
+    "full" draws every frame at full size. "preview" draws at most preview_fps
+    frames per second, scaled to preview_scale, so a monitoring screen costs a
+    fraction of the drawing. "none" draws nothing: rep counting, recording and
+    events carry on, for kiosks with the screen off and headless runs. The
+    text overlays of the rep counts are cached TextOverlays scaled with the
+    frame.
+    """
+
+    def __init__(self, mode="full", preview_fps=5.0, preview_scale=0.5):
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode {mode!r}, expected one of {', '.join(RENDER_MODES)}")
+        self.mode = mode
+        self.preview_fps = preview_fps
+        self.scale = preview_scale if mode == "preview" else 1.0
+        self.next_render = None
+        self.skipped = 0
+        self.overlays = {}
+
+    @property
+    def enabled(self):
+        return self.mode != "none"
+
+    def should_render(self, timestamp):
+        """Whether the frame captured at timestamp (seconds) is drawn."""
+        if self.mode == "full":
+            return True
+        if self.mode == "preview" and (self.next_render is None or timestamp >= self.next_render):
+            # On a fixed schedule, so preview_fps holds for any camera rate
+            interval = 1.0 / self.preview_fps
+            self.next_render = timestamp + interval if self.next_render is None else self.next_render + interval
+            if self.next_render <= timestamp:
+                self.next_render = timestamp + interval  # Fell behind; do not catch up with a burst
+            return True
+        self.skipped += 1
+        return False
+
+    def prepare(self, img):
+        """The image to draw on: the frame itself, or a scaled-down copy for a preview."""
+        if self.scale == 1.0:
+            return img
+        return cv2.resize(img, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def overlay(self, name, origin=(10, 30), line_height=40, scale=1.0, color=(0, 255, 0), thickness=2):
+        """The cached TextOverlay called name, created for this policy's scale on first use."""
+        overlay = self.overlays.get(name)
+        if overlay is None:
+            overlay = self.overlays[name] = TextOverlay(
+                (round(origin[0] * self.scale), round(origin[1] * self.scale)), round(line_height * self.scale),
+                scale * self.scale, color, max(round(thickness * self.scale), 1))
+        return overlay
+
+
+def add_render_arguments(parser):
+    parser.add_argument("--render", choices=RENDER_MODES, default="full",
+                        help="Draw every frame (full), a reduced-rate, reduced-size preview, or nothing (none)")
+    parser.add_argument("--preview-fps", type=float, default=5.0, help="Frames per second drawn in preview mode")
+
+
+def render_policy_from_args(args):
+    return RenderPolicy(args.render, args.preview_fps)
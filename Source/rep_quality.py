@@ -0,0 +1,121 @@
+from collections import namedtuple
+
+import numpy as np
+
+from exercises import ExerciseTable
+
+# Angles in degrees, times in seconds, peak_velocity in degrees per second.
+# symmetry compares the range of motion of the left and right side, 1.0 when
+# equal; None for one-sided exercises done without their mirror.
+RepStats = namedtuple("RepStats", ["exercise", "number", "started_at", "ended_at", "min_angle", "max_angle",
+                                   "range_of_motion", "concentric_s", "eccentric_s", "peak_velocity", "symmetry"])
+
+
+def symmetry(a, b):
+    """1.0 when two ranges of motion are equal, down to 0.0 when one side does not move."""
+    high = max(a, b)
+    return min(a, b) / high if high > 0 else None
+
+
+def mirror_of(name):
+    if name.startswith("right_"):
+        return "left_" + name[len("right_"):]
+    if name.startswith("left_"):
+        return "right_" + name[len("left_"):]
+    return None
+
+
+class RepAnalyzer:
+    """Rep quality (range of motion, tempo, peak speed, symmetry) kept up to date frame by frame.
+
+    Feed it the angles and the counted mask of each exercises.RepCounter
+    update; it returns a RepStats for every rep that ends on that frame. Only
+    running values of the rep in progress are kept (fixed-size arrays per
+    exercise and joint), so memory does not grow with the length of a set.
+
+    A rep runs from the previous count (or the first frame) to its own count.
+    It turns around at the extreme angle opposite the count phase, e.g. the
+    most extended elbow between two curls, which splits it into its
+    concentric and eccentric halves as the exercise's concentric_phase says.
+    Squats compare the two knees; the right and left curls of choice 3
+    compare each rep with the latest rep of the other arm.
+    """
+
+    def __init__(self, exercise_names):
+        table = ExerciseTable(exercise_names)
+        count = len(table.names)
+        self.names = table.names
+        self.joint_index = table.joint_index
+        self.joint_valid = table.joint_valid
+        # Counting on entering a "below" phase means the turnaround is the highest angle
+        self.turn_at_max = table.below[np.arange(count), table.count_phase]
+        self.concentric_last = table.concentric_phase == table.count_phase
+        self.mirror = [self.names.index(mirror_of(name)) if mirror_of(name) in self.names else -1
+                       for name in self.names]
+
+        self.number = np.zeros(count, dtype=np.int32)
+        self.last_range = np.full(count, np.nan)
+        self.started_at = np.full(count, np.nan)
+        self.low = np.full(self.joint_index.shape, np.inf)
+        self.high = np.full(self.joint_index.shape, -np.inf)
+        self.turn_value = np.where(self.turn_at_max, -np.inf, np.inf)
+        self.turn_time = np.full(count, np.nan)
+        self.peak_velocity = np.zeros(count)
+        self.previous_angles = None
+        self.previous_time = None
+
+    def _reset(self, e, timestamp):
+        self.started_at[e] = timestamp
+        self.low[e] = np.inf
+        self.high[e] = -np.inf
+        self.turn_value[e] = -np.inf if self.turn_at_max[e] else np.inf
+        self.turn_time[e] = timestamp
+        self.peak_velocity[e] = 0.0
+
+    def update(self, angles, counted, timestamp):
+        """Advance one frame of (len(JOINT_NAMES),) angles; counted is the (exercises,) mask of RepCounter.update."""
+        angles = np.asarray(angles, dtype=float)[self.joint_index]  # (exercises, joints)
+        angles = np.where(self.joint_valid, angles, np.nan)
+        self.started_at = np.where(np.isnan(self.started_at), timestamp, self.started_at)
+        self.turn_time = np.where(np.isnan(self.turn_time), timestamp, self.turn_time)
+
+        self.low = np.fmin(self.low, angles)
+        self.high = np.fmax(self.high, angles)
+        seen = ~np.isnan(angles)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(seen, angles, 0.0).sum(axis=1) / seen.sum(axis=1)  # NaN without any angle
+        turned = np.where(self.turn_at_max, mean > self.turn_value, mean < self.turn_value)
+        self.turn_value = np.where(turned, mean, self.turn_value)
+        self.turn_time = np.where(turned, timestamp, self.turn_time)
+
+        if self.previous_angles is not None and timestamp > self.previous_time:
+            velocity = np.abs(angles - self.previous_angles) / (timestamp - self.previous_time)
+            self.peak_velocity = np.fmax(self.peak_velocity, np.fmax.reduce(velocity, axis=1))
+        self.previous_angles = angles
+        self.previous_time = timestamp
+
+        return [self._finish(e, timestamp) for e in np.flatnonzero(np.asarray(counted).reshape(-1))]
+
+    def _finish(self, e, timestamp):
+        valid = self.joint_valid[e]
+        low, high = self.low[e][valid], self.high[e][valid]
+        ranges = high - low
+        range_of_motion = float(ranges.mean())
+        first_half = float(self.turn_time[e] - self.started_at[e])
+        second_half = float(timestamp - self.turn_time[e])
+        concentric, eccentric = (second_half, first_half) if self.concentric_last[e] else (first_half, second_half)
+
+        if len(ranges) == 2:
+            rep_symmetry = symmetry(ranges[0], ranges[1])
+        elif self.mirror[e] >= 0 and not np.isnan(self.last_range[self.mirror[e]]):
+            rep_symmetry = symmetry(range_of_motion, self.last_range[self.mirror[e]])
+        else:
+            rep_symmetry = None
+
+        self.number[e] += 1
+        self.last_range[e] = range_of_motion
+        stats = RepStats(self.names[e], int(self.number[e]), float(self.started_at[e]), float(timestamp),
+                         float(low.min()), float(high.max()), range_of_motion, concentric, eccentric,
+                         float(self.peak_velocity[e]), None if rep_symmetry is None else float(rep_symmetry))
+        self._reset(e, timestamp)
+        return stats
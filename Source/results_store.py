@@ -0,0 +1,295 @@
+import argparse
+import json
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from exercises import RepCounter
+from kinematics import JOINT_NAMES, joint_angles, landmark_array
+from rep_quality import RepAnalyzer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS sets (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    exercises TEXT NOT NULL,
+    target_reps INTEGER,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    frames INTEGER NOT NULL,
+    completed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reps (
+    set_id INTEGER NOT NULL,
+    exercise TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    min_angle REAL,
+    max_angle REAL,
+    range_of_motion REAL,
+    concentric_s REAL,
+    eccentric_s REAL,
+    peak_velocity REAL,
+    symmetry REAL
+);
+CREATE TABLE IF NOT EXISTS angle_chunks (
+    set_id INTEGER NOT NULL,
+    first_frame INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    timestamps BLOB NOT NULL,
+    angles BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_user ON sessions (user, started_at);
+CREATE INDEX IF NOT EXISTS sets_session ON sets (session_id);
+CREATE INDEX IF NOT EXISTS sets_started ON sets (started_at);
+CREATE INDEX IF NOT EXISTS reps_set ON reps (set_id);
+CREATE INDEX IF NOT EXISTS reps_exercise ON reps (exercise, started_at);
+CREATE INDEX IF NOT EXISTS angle_chunks_set ON angle_chunks (set_id, first_frame);
+"""
+
+class ResultsStore:
+    """SQLite database of sessions, sets, reps and per-frame joint angles.
+
+    Rows are only ever inserted. insert() queues them for a writer thread that
+    commits them in batches of up to batch_size rows, or every flush_interval
+    seconds, so the frame loop never waits on the disk. IDs are handed out in
+    process, so one process writes to a database file at a time; any number
+    can read it. Angles are stored in chunks of frames as float32 blobs of
+    (frames, len(JOINT_NAMES)) with their float32 seconds since the set
+    started, which keeps the rows few and the columns contiguous.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")  # Readers do not block the writer
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.id_lock = threading.Lock()
+        self.next_ids = {table: (self.connection.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0) + 1
+                         for table in ("sessions", "sets")}
+        self.rows = queue.Queue()
+        self.writer = threading.Thread(target=self._write, name="results store", daemon=True)
+        self.writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def new_id(self, table):
+        with self.id_lock:
+            new_id = self.next_ids[table]
+            self.next_ids[table] += 1
+        return new_id
+
+    def insert(self, table, row):
+        """Queue a {column: value} row for insertion."""
+        self.rows.put((table, row))
+
+    def _write(self):
+        running = True
+        while running:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.rows.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    self.rows.task_done()
+                    break
+                batch.append(item)
+            if batch:
+                with self.connection:  # One transaction per batch
+                    for table, row in batch:
+                        self.connection.execute(f"INSERT INTO {table} ({', '.join(row)}) "
+                                                f"VALUES ({', '.join('?' * len(row))})", tuple(row.values()))
+                for _ in batch:
+                    self.rows.task_done()
+
+    def flush(self):
+        """Wait until every queued row is committed."""
+        self.rows.join()
+
+    def close(self):
+        if not self.writer.is_alive():
+            return
+        self.rows.put(None)
+        self.writer.join()
+        self.connection.close()
+
+    def start_session(self, user, source=None):
+        session_id = self.new_id("sessions")
+        self.insert("sessions", {"id": session_id, "user": user, "started_at": time.time(), "source": source})
+        return session_id
+
+    def query(self, sql, params=()):
+        """Run a read query on a connection of its own and return the rows as dicts."""
+        connection = sqlite3.connect(self.path)
+        connection.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in connection.execute(sql, params)]
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _filters(user, exercise, since, until, time_column):
+        conditions, params = [], []
+        if user is not None:
+            conditions.append("sessions.user = ?")
+            params.append(user)
+        if exercise is not None:
+            conditions.append("reps.exercise = ?")
+            params.append(exercise)
+        if since is not None:
+            conditions.append(f"{time_column} >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append(f"{time_column} < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def sets(self, user=None, since=None, until=None):
+        """The sets of a user (or everyone) started between since and until (time.time() seconds), newest first."""
+        where, params = self._filters(user, None, since, until, "sets.started_at")
+        return self.query("SELECT sets.*, sessions.user FROM sets JOIN sessions ON sessions.id = sets.session_id"
+                          f"{where} ORDER BY sets.started_at DESC", params)
+
+    def rep_summary(self, user=None, exercise=None, since=None, until=None):
+        """Reps, mean rep duration, range of motion, tempo and symmetry per user, exercise and day."""
+        where, params = self._filters(user, exercise, since, until, "reps.started_at")
+        return self.query(
+            "SELECT sessions.user, reps.exercise, date(reps.started_at, 'unixepoch', 'localtime') AS day, "
+            "COUNT(*) AS reps, AVG(reps.ended_at - reps.started_at) AS mean_duration, "
+            "AVG(reps.range_of_motion) AS mean_range_of_motion, "
+            "AVG(reps.concentric_s) AS mean_concentric_s, AVG(reps.eccentric_s) AS mean_eccentric_s, "
+            "MAX(reps.peak_velocity) AS peak_velocity, AVG(reps.symmetry) AS mean_symmetry "
+            "FROM reps JOIN sets ON sets.id = reps.set_id JOIN sessions ON sessions.id = sets.session_id"
+            f"{where} GROUP BY sessions.user, reps.exercise, day ORDER BY day, sessions.user, reps.exercise",
+            params)
+
+    def reps(self, set_id):
+        return self.query("SELECT * FROM reps WHERE set_id = ? ORDER BY started_at", (set_id,))
+
+    def angles(self, set_id):
+        """(timestamps, angles) of every recorded frame of a set, angles with JOINT_NAMES columns."""
+        chunks = self.query("SELECT timestamps, angles FROM angle_chunks WHERE set_id = ? ORDER BY first_frame",
+                            (set_id,))
+        if not chunks:
+            return np.empty(0, dtype=np.float32), np.empty((0, len(JOINT_NAMES)), dtype=np.float32)
+        timestamps = np.concatenate([np.frombuffer(chunk["timestamps"], dtype="<f4") for chunk in chunks])
+        angles = np.concatenate([np.frombuffer(chunk["angles"], dtype="<f4") for chunk in chunks])
+        return timestamps, angles.reshape(-1, len(JOINT_NAMES))
+
+
+class SetRecorder:
+    """Record one set into a ResultsStore: its angles every frame, a row per rep, and the set when it ends.
+
+    Has the write(results, timestamp) / write_array(landmarks, timestamp)
+    interface of landmark_trace.TraceWriter, so it fits wherever frames are
+    recorded. Timestamps are time.perf_counter() seconds, as in the frame
+    loops; rows are stored with time.time() seconds. Each rep row holds the
+    rep_quality.RepStats of the rep. After follow(), the reps are those of
+    another counter instead of its own.
+    """
+
+    def __init__(self, store, session_id, exercise_names, target_reps=None, chunk_size=256):
+        self.store = store
+        self.session_id = session_id
+        self.set_id = store.new_id("sets")
+        self.target_reps = target_reps
+        self.counter = RepCounter(exercise_names)
+        self.analyzer = RepAnalyzer(exercise_names)
+        self.source = None
+        self.chunk_timestamps = np.zeros(chunk_size, dtype="<f4")
+        self.chunk_angles = np.zeros((chunk_size, len(JOINT_NAMES)), dtype="<f4")
+        self.pending = 0
+        self.frames = 0
+        self.clock_offset = time.time() - time.perf_counter()
+        self.started_at = None
+
+    def follow(self, counter):
+        """Store the reps of counter, e.g. a streams.Detector's, which its owner updates before each write()."""
+        if counter.table.names != self.counter.table.names:
+            raise ValueError(f"Cannot follow a counter of {counter.table.names}, expected {self.counter.table.names}")
+        self.source = counter
+
+    def write(self, results, timestamp=None):
+        self.write_array(landmark_array(results), timestamp)
+
+    def write_array(self, landmarks, timestamp=None):
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        wall_time = timestamp + self.clock_offset
+        if self.started_at is None:
+            self.started_at = wall_time
+
+        angles = joint_angles(landmarks)
+        counted = (self.counter.update(angles) if self.source is None else self.counter.follow(self.source))[0]
+        for stats in self.analyzer.update(angles, counted, wall_time):
+            self.store.insert("reps", {"set_id": self.set_id, **stats._asdict()})
+
+        self.chunk_timestamps[self.pending] = wall_time - self.started_at
+        self.chunk_angles[self.pending] = angles
+        self.pending += 1
+        self.frames += 1
+        if self.pending == len(self.chunk_timestamps):
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.store.insert("angle_chunks", {
+            "set_id": self.set_id, "first_frame": self.frames - self.pending, "frames": self.pending,
+            "timestamps": self.chunk_timestamps[:self.pending].tobytes(),
+            "angles": self.chunk_angles[:self.pending].tobytes()})
+        self.pending = 0
+
+    def close(self, completed=None):
+        """Store the rest of the angles and the set itself; completed defaults to reaching target_reps."""
+        self.flush()
+        if completed is None:
+            completed = bool(self.target_reps) and bool((self.counter.reps >= self.target_reps).all())
+        now = time.time()
+        self.store.insert("sets", {
+            "id": self.set_id, "session_id": self.session_id, "exercises": ",".join(self.counter.table.names),
+            "target_reps": self.target_reps, "started_at": self.started_at or now, "ended_at": now,
+            "frames": self.frames, "completed": int(completed)})
+
+
+def parse_date(text):
+    return datetime.strptime(text, "%Y-%m-%d").timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the reps stored in a results database.")
+    parser.add_argument("database")
+    parser.add_argument("--user", help="Only this user")
+    parser.add_argument("--exercise", help="Only this exercise, e.g. squats")
+    parser.add_argument("--since", type=parse_date, help="From this date (YYYY-MM-DD)")
+    parser.add_argument("--until", type=parse_date, help="Before this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    with ResultsStore(args.database) as store:
+        print(json.dumps(store.rep_summary(args.user, args.exercise, args.since, args.until), indent=2))
+
+
+if __name__ == "__main__":
+    main()
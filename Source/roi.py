@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+
+class RoiTracker:
+    """Crop and shrink the pose input to the area around the person found in the previous frame.
+
+    The landmarks of a cropped inference are mapped back to full-frame
+    coordinates, so callers see the same results as without cropping. When the
+    person is lost, or the mean landmark visibility drops below min_visibility,
+    the next inference runs on the full frame again, unless full_frame is
+    False (one tracker per person of a group, where the full frame would
+    find someone else); then results without a pose are returned until a new
+    box is set.
+    """
+
+    def __init__(self, margin=0.25, min_visibility=0.5, input_size=384, full_frame=True):
+        self.margin = margin
+        self.min_visibility = min_visibility
+        self.input_size = input_size
+        self.full_frame = full_frame
+        self.box = None  # (x0, y0, x1, y1) in full-frame pixels
+        self.cropped_frames = 0
+        self.full_frames = 0
+
+    def reset(self):
+        self.box = None
+
+    def process(self, pose, img):
+        """Run pose.process on the BGR frame img, cropped to the tracked region when there is one."""
+        height, width = img.shape[:2]
+
+        if self.box is not None:
+            x0, y0, x1, y1 = self.box
+            crop = img[y0:y1, x0:x1]
+            scale = self.input_size / max(crop.shape[:2])
+            if scale < 1:
+                crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+            results = pose.process(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+            self.cropped_frames += 1
+            if self.confident(results):
+                self.to_frame(results, x0, y0, x1 - x0, y1 - y0, width, height)
+                self.update_box(results, width, height)
+                return results
+            self.box = None  # Lost track, look at the whole frame
+
+        if not self.full_frame:
+            return SimpleNamespace(pose_landmarks=None)
+
+        results = pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        self.full_frames += 1
+        if self.confident(results):
+            self.update_box(results, width, height)
+        return results
+
+    def confident(self, results):
+        if not results.pose_landmarks:
+            return False
+        visibility = [lm.visibility for lm in results.pose_landmarks.landmark]
+        return sum(visibility) / len(visibility) >= self.min_visibility
+
+    def to_frame(self, results, x0, y0, crop_width, crop_height, width, height):
+        """Map landmarks normalized to the crop back to full-frame normalized coordinates."""
+        for lm in results.pose_landmarks.landmark:
+            lm.x = (x0 + lm.x * crop_width) / width
+            lm.y = (y0 + lm.y * crop_height) / height
+            lm.z = lm.z * crop_width / width  # z uses the same scale as x
+
+    def update_box(self, results, width, height):
+        points = np.array([(lm.x, lm.y) for lm in results.pose_landmarks.landmark
+                           if lm.visibility >= self.min_visibility])
+        if len(points) < 2:
+            self.box = None
+            return
+
+        x0, y0 = points.min(axis=0) * (width, height)
+        x1, y1 = points.max(axis=0) * (width, height)
+        pad = self.margin * max(x1 - x0, y1 - y0)
+        box = (int(max(x0 - pad, 0)), int(max(y0 - pad, 0)),
+               int(min(x1 + pad, width)), int(min(y1 + pad, height)))
+        self.box = box if box[2] - box[0] > 1 and box[3] - box[1] > 1 else None
@@ -0,0 +1,221 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from exercises import CHOICES, RepCounter
+from kinematics import NUM_LANDMARKS, fill_landmarks, joint_angles
+from pipeline import LatestQueue, StageStats
+from smoothing import LandmarkFilter
+
+
+class Session:
+    """One station: a video source with its own pose tracker, rep state and stats."""
+
+    def __init__(self, session_id, source, exercise_names, pose, smooth=False):
+        self.session_id = session_id
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video source {source}")
+        self.pose = pose
+        self.smoother = LandmarkFilter() if smooth else None
+        self.counter = RepCounter(exercise_names)
+        self.landmarks = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)  # Refilled every frame
+
+        # Recorded videos are played at their own frame rate, like a live camera
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if not isinstance(source, int) else 0
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+
+        self.frames = LatestQueue(1)  # Backpressure: a slow session only ever holds its newest frame
+        self.latency_stats = StageStats(f"session {session_id}")
+        self.scheduled = False  # Queued for or being processed by a worker; guarded by the manager
+        self.finished = False
+        self.capture_thread = None
+
+    def reps(self):
+        return dict(zip(self.counter.table.names, self.counter.reps[0].tolist()))
+
+
+class SessionManager:
+    """Serve many video sources from one process with a shared pool of inference workers.
+
+    Every session has a capture thread that keeps only its newest frame. A
+    session with a new frame joins a FIFO ready queue once, and goes to the back
+    of it again after each inference, so workers serve the sessions round-robin
+    and a busy session cannot starve the others.
+    """
+
+    def __init__(self, workers=None):
+        self.worker_count = workers or os.cpu_count() or 1
+        self.sessions = []
+        self.ready = deque()
+        self.cond = threading.Condition()
+        self.running = False
+        self.workers = []
+        self.processed = 0
+        self.start_time = None
+
+    def add_session(self, source, exercise_names, pose=None, smooth=False):
+        if pose is None:
+            import mediapipe as mp
+            pose = mp.solutions.pose.Pose()
+        session = Session(len(self.sessions), source, exercise_names, pose, smooth)
+        self.sessions.append(session)
+        if self.running:
+            self._start_capture(session)
+        return session
+
+    def start(self):
+        self.running = True
+        self.start_time = time.perf_counter()
+        for session in self.sessions:
+            self._start_capture(session)
+        for i in range(self.worker_count):
+            worker = threading.Thread(target=self._worker_loop, name=f"worker {i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        return self
+
+    def stop(self):
+        """Stop the workers and capture threads, then release the captures.
+
+        Joins without a timeout: a capture thread can be inside cap.read(),
+        and releasing the capture under it would crash the backend.
+        """
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        for thread in self.workers + [session.capture_thread for session in self.sessions]:
+            if thread is not None:
+                thread.join()
+        for session in self.sessions:
+            session.cap.release()
+
+    def _start_capture(self, session):
+        session.capture_thread = threading.Thread(target=self._capture_loop, args=(session,),
+                                                  name=f"capture {session.session_id}", daemon=True)
+        session.capture_thread.start()
+
+    def _capture_loop(self, session):
+        next_frame = time.perf_counter()
+        try:
+            while self.running:
+                if session.frame_interval:
+                    next_frame += session.frame_interval
+                    time.sleep(max(next_frame - time.perf_counter(), 0))
+                success, img = session.cap.read()
+                if not success:
+                    break
+                session.frames.put((img, time.perf_counter()))
+                self._schedule(session)
+        except Exception as e:
+            print(f"Error in capture for session {session.session_id}: {e}")
+        session.finished = True
+
+    def _schedule(self, session):
+        with self.cond:
+            if not session.scheduled:
+                session.scheduled = True
+                self.ready.append(session)
+                self.cond.notify()
+
+    def _worker_loop(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.ready or not self.running)
+                if not self.running:
+                    return
+                session = self.ready.popleft()
+
+            try:
+                img, captured_at = session.frames.get(timeout=0)
+                results = session.pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+                fill_landmarks(session.landmarks, results)
+                landmarks = session.landmarks
+                if session.smoother is not None:
+                    landmarks = session.smoother.filter(landmarks, captured_at)
+                counted = session.counter.update(joint_angles(landmarks))
+                session.latency_stats.record(captured_at)
+                with self.cond:
+                    self.processed += 1
+                if counted.any():
+                    print(f"Session {session.session_id} reps: {session.reps()}")
+            except queue.Empty:
+                pass
+            except Exception as e:
+                print(f"Error in session {session.session_id}: {e}")
+
+            with self.cond:
+                session.scheduled = False
+                if len(session.frames):
+                    session.scheduled = True
+                    self.ready.append(session)  # Back of the queue, behind the other sessions
+                    self.cond.notify()
+
+    def throughput(self):
+        """Frames inferred per second over all sessions since start()."""
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {
+            "throughput_fps": self.throughput(),
+            "sessions": [
+                {
+                    "session": session.session_id,
+                    "source": str(session.source),
+                    "fps": session.latency_stats.fps,
+                    "latency_ms": session.latency_stats.latency_ms,
+                    "dropped_frames": session.frames.dropped,
+                    "reps": session.reps(),
+                }
+                for session in self.sessions
+            ],
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"Total: {stats['throughput_fps']:.1f} fps over {len(self.sessions)} sessions")
+        for session in stats["sessions"]:
+            print(f"  Session {session['session']} ({session['source']}): {session['fps']:.1f} fps, "
+                  f"{session['latency_ms']:.1f} ms, {session['dropped_frames']} dropped, reps {session['reps']}")
+
+
+def parse_source(source):
+    return int(source) if source.isdigit() else source
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count reps for several cameras or videos in one process.")
+    parser.add_argument("sources", nargs="+", help="Camera indices or video files/URLs, one per station")
+    parser.add_argument("--choice", type=int, choices=[1, 2, 3, 4], default=1,
+                        help="1: right arm curls, 2: left arm curls, 3: both arms curls, 4: squats")
+    parser.add_argument("--workers", type=int, default=None, help="Inference worker threads (default: all cores)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between stats reports")
+    parser.add_argument("--smooth", action="store_true",
+                        help="Smooth the landmarks over time so jitter near a threshold cannot double count")
+    args = parser.parse_args()
+
+    manager = SessionManager(args.workers)
+    for source in args.sources:
+        manager.add_session(parse_source(source), CHOICES[args.choice], smooth=args.smooth)
+    manager.start()
+    try:
+        while not all(session.finished for session in manager.sessions):
+            time.sleep(args.interval)
+            manager.print_stats()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop()
+    manager.print_stats()
+
+
+if __name__ == "__main__":
+    main()
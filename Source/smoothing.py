@@ -0,0 +1,96 @@
+import numpy as np
+
+from kinematics import NUM_LANDMARKS, PoseLandmark, landmark_array
+
+# Per-landmark One-Euro parameters. min_cutoff (Hz) sets the smoothing of a
+# landmark at rest, beta how quickly the cutoff rises with its speed. The face
+# barely moves during the exercises and is smoothed hardest; the joints carrying
+# the rep motion get a fast response.
+MIN_CUTOFF = np.full(NUM_LANDMARKS, 1.0, dtype=np.float32)
+BETA = np.full(NUM_LANDMARKS, 40.0, dtype=np.float32)
+MIN_CUTOFF[:PoseLandmark.MOUTH_RIGHT + 1] = 0.5
+BETA[:PoseLandmark.MOUTH_RIGHT + 1] = 10.0
+
+# Weight of the new measurement for a landmark with zero visibility, relative to a fully visible one
+MIN_WEIGHT = 0.1
+
+
+def smoothing_factor(cutoff, dt):
+    tau = 1.0 / (2 * np.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class LandmarkFilter:
+    """One-Euro filter over the x, y and z of all landmarks at once.
+
+    Each landmark is low-pass filtered with a cutoff that rises with its speed,
+    so jitter at rest is removed while fast reps are followed with little lag.
+    min_cutoff and beta are scalars or one value per landmark (MIN_CUTOFF and
+    BETA by default). Landmarks with visibility below min_visibility move
+    toward new measurements proportionally more slowly, so an occluded joint
+    does not jump. Filtering a frame without a pose, or after a gap of more
+    than reset_after seconds, starts over from the next measurement.
+
+    Works on (..., 33, 4) landmark arrays, e.g. one row per tracked person.
+    """
+
+    def __init__(self, min_cutoff=MIN_CUTOFF, beta=BETA, derivative_cutoff=1.0, min_visibility=0.5,
+                 reset_after=0.5):
+        self.min_cutoff = np.asarray(min_cutoff, dtype=np.float32)[..., None]
+        self.beta = np.asarray(beta, dtype=np.float32)[..., None]
+        self.derivative_cutoff = derivative_cutoff
+        self.min_visibility = min_visibility
+        self.reset_after = reset_after
+        self.reset()
+
+    def reset(self):
+        self.position = None
+        self.velocity = None
+        self.timestamp = None
+
+    def filter(self, landmarks, timestamp):
+        """Return a smoothed copy of the landmark array captured at `timestamp` seconds."""
+        if np.isnan(landmarks[..., 0, 0]).any():
+            self.reset()
+            return landmarks
+
+        dt = timestamp - self.timestamp if self.timestamp is not None else 0.0
+        if self.position is None or self.position.shape != landmarks[..., :3].shape or not (
+                0 < dt <= self.reset_after):
+            self.position = landmarks[..., :3].copy()
+            self.velocity = np.zeros_like(self.position)
+            self.timestamp = timestamp
+            return landmarks
+
+        position = landmarks[..., :3]
+        velocity = (position - self.position) / dt
+        self.velocity += smoothing_factor(self.derivative_cutoff, dt) * (velocity - self.velocity)
+
+        speed = np.linalg.norm(self.velocity, axis=-1, keepdims=True)
+        alpha = smoothing_factor(self.min_cutoff + self.beta * speed, dt)
+        alpha *= np.clip(landmarks[..., 3:] / self.min_visibility, MIN_WEIGHT, 1.0)
+        self.position += alpha * (position - self.position)
+        self.timestamp = timestamp
+
+        smoothed = landmarks.copy()
+        smoothed[..., :3] = self.position
+        return smoothed
+
+    def apply(self, results, timestamp):
+        """Smooth MediaPipe results in place and return them."""
+        if not results.pose_landmarks:
+            self.reset()
+            return results
+        smoothed = self.filter(landmark_array(results), timestamp)
+        for lm, (x, y, z, _) in zip(results.pose_landmarks.landmark, smoothed.tolist()):
+            lm.x, lm.y, lm.z = x, y, z
+        return results
+
+
+def smooth_trace(landmarks, timestamps, **kwargs):
+    """Run a LandmarkFilter over a recorded (frames, 33, 4) trace and return the smoothed trace."""
+    landmark_filter = LandmarkFilter(**kwargs)
+    smoothed = np.empty_like(landmarks)
+    for frame, (frame_landmarks, timestamp) in enumerate(zip(landmarks, timestamps)):
+        smoothed[frame] = landmark_filter.filter(frame_landmarks, timestamp)
+    return smoothed
@@ -0,0 +1,321 @@
+"""Composable generator stages: source -> resize -> infer -> smooth -> angles -> count -> sink.
+
+Every stage takes an iterable of Frames and yields them on, so a stream is
+built by nesting calls and nothing runs until the sink pulls a frame through.
+Landmarks and angles are computed on first access, so a stage that never reads
+them never pays for them, and a counting-only stream never draws.
+"""
+
+import argparse
+import queue
+import time
+
+import cv2
+import numpy as np
+
+from exercises import CHOICES, RepCounter
+from frame_source import FrameSource
+from kinematics import NUM_LANDMARKS, fill_landmarks, joint_angles, landmark_array
+from smoothing import LandmarkFilter
+
+
+class Frame:
+    """One frame moving through a stream, with what the stages have added to it."""
+
+    def __init__(self, image=None, timestamp=None, results=None, landmarks=None):
+        self.image = image
+        self.timestamp = timestamp
+        self.results = results
+        self.read_at = time.perf_counter()  # When the frame entered the stream, for render timing
+        self.counted = None
+        self.reps = None
+        self.rep_stats = []
+        self.render = True  # False for frames a render.RenderPolicy does not draw
+        self._landmarks = landmarks
+        self._angles = None
+
+    @property
+    def landmarks(self):
+        """(33, 4) landmark array, from the pose results unless a stage set it."""
+        if self._landmarks is None:
+            self._landmarks = landmark_array(self.results)
+        return self._landmarks
+
+    @landmarks.setter
+    def landmarks(self, landmarks):
+        self._landmarks = landmarks
+        self._angles = None
+
+    @property
+    def angles(self):
+        if self._angles is None:
+            self._angles = joint_angles(self.landmarks)
+        return self._angles
+
+
+def capture(cap):
+    """Source stage: frames read from an open cv2.VideoCapture until it runs out."""
+    while True:
+        success, img = cap.read()
+        if not success:
+            return
+        yield Frame(img, time.perf_counter())
+
+
+def from_source(source):
+    """Source stage: the frames of a frame_source.FrameSource, stamped with their time in the video."""
+    for _, timestamp, img in source:
+        yield Frame(img, timestamp)
+
+
+def from_pipeline(pipeline, timeout=None, running=None):
+    """Source stage: inferred frames from a started PosePipeline.
+
+    With a timeout, the stream checks running() whenever no frame arrived in
+    time and ends once it returns False.
+    """
+    while running is None or running():
+        try:
+            item = pipeline.read(timeout)
+        except queue.Empty:
+            continue
+        if item is None:
+            return
+        img, results, captured_at = item
+        yield Frame(img, captured_at, results)
+
+
+def from_trace(trace):
+    """Source stage: recorded landmarks from a landmark_trace.load_trace() array, without images."""
+    for timestamp, landmarks in zip(trace["timestamp"], trace["landmarks"]):
+        yield Frame(timestamp=float(timestamp), landmarks=landmarks)
+
+
+def resize(frames, percent=75):
+    """Scale the images, by the percentage VideoHandler.rescale_frame uses by default."""
+    for frame in frames:
+        width = int(frame.image.shape[1] * percent / 100)
+        height = int(frame.image.shape[0] * percent / 100)
+        frame.image = cv2.resize(frame.image, (width, height), interpolation=cv2.INTER_AREA)
+        yield frame
+
+
+def infer(frames, pose, roi=None, metrics=None):
+    """Run pose estimation on each image, on a crop around the person with a roi.RoiTracker."""
+    for frame in frames:
+        start = time.perf_counter()
+        if roi is not None:
+            frame.results = roi.process(pose, frame.image)
+        else:
+            frame.results = pose.process(cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB))
+        frame.landmarks = None
+        if metrics is not None:
+            metrics.observe("inference", time.perf_counter() - start)
+        yield frame
+
+
+def smooth(frames, landmark_filter):
+    """Smooth landmarks over time with a smoothing.LandmarkFilter, in the pose results when there are any."""
+    for frame in frames:
+        if frame.results is not None:
+            landmark_filter.apply(frame.results, frame.timestamp)
+            frame.landmarks = None
+        else:
+            frame.landmarks = landmark_filter.filter(frame.landmarks, frame.timestamp)
+        yield frame
+
+
+def count(frames, counter):
+    """Advance an exercises.RepCounter on each frame's angles; sets frame.counted and frame.reps."""
+    for frame in frames:
+        frame.counted = counter.update(frame.angles)
+        frame.reps = counter.reps[0].copy()
+        yield frame
+
+
+def analyze(frames, analyzer):
+    """Run a rep_quality.RepAnalyzer after count(); sets frame.rep_stats to the reps that ended on the frame."""
+    for frame in frames:
+        frame.rep_stats = analyzer.update(frame.angles, frame.counted[0], frame.timestamp)
+        yield frame
+
+
+def until_reps(frames, target):
+    """Stop after the frame on which every counted exercise reaches target reps."""
+    for frame in frames:
+        yield frame
+        if frame.reps is not None and (frame.reps >= target).all():
+            return
+
+
+def record(frames, recorder):
+    """Pass each frame's pose results to recorder.write(), e.g. a TraceWriter or event_server.RepPublisher."""
+    for frame in frames:
+        recorder.write(frame.results, frame.timestamp)
+        yield frame
+
+
+def render(frames, policy):
+    """Apply a render.RenderPolicy: mark the frames it skips, and scale the ones it draws."""
+    for frame in frames:
+        frame.render = policy.should_render(frame.timestamp)
+        if frame.render:
+            frame.image = policy.prepare(frame.image)
+        yield frame
+
+
+def draw_landmarks(frames, mpDraw, mpPose, metrics=None):
+    for frame in frames:
+        if not frame.render:
+            yield frame
+            continue
+        start = time.perf_counter()
+        if frame.results.pose_landmarks:
+            mpDraw.draw_landmarks(frame.image, frame.results.pose_landmarks, mpPose.POSE_CONNECTIONS)
+        if metrics is not None:
+            metrics.observe("draw_landmarks", time.perf_counter() - start)
+        yield frame
+
+
+def detect(frames, detector, mpPose, metrics=None):
+    """Count each frame with a Detector."""
+    for frame in frames:
+        start = time.perf_counter()
+        detector.update(frame.image, frame.results, mpPose)
+        if metrics is not None:
+            metrics.observe("detect", time.perf_counter() - start)
+        yield frame
+
+
+def sink(frames, callback=None):
+    """Pull every frame through the stream, calling callback on each; returns the last frame."""
+    frame = None
+    for frame in frames:
+        if callback is not None:
+            callback(frame)
+    return frame
+
+
+# What the Detector prints as each exercise counts a rep
+REP_MESSAGES = {"right_curls": "Right Reps completed", "left_curls": "Left Reps completed",
+                "squats": "Squats completed"}
+
+
+class Detector:
+    """The rep state of one exercise choice, as the app loops keep it, read from one reused landmarks array.
+
+    Each frame's landmarks are copied into the same preallocated (33, 4)
+    float32 array and counted by an exercises.RepCounter of CHOICES[choice]
+    on their kinematics.joint_angles, so the app loops count with the same
+    state machine as the batch and session runners. Consumers such as
+    event_server.RepPublisher and results_store.SetRecorder follow() the
+    counter instead of counting again.
+    """
+
+    __slots__ = ("choice", "reps", "landmarks", "counter")
+
+    def __init__(self, choice, reps):
+        self.choice = choice
+        self.reps = reps
+        self.landmarks = np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+        self.counter = RepCounter(CHOICES[choice])
+
+    def update(self, img, results, mpPose=None):
+        """Count one frame of MediaPipe results; img and mpPose are unused, kept for existing callers."""
+        if fill_landmarks(self.landmarks, results):
+            self._step()
+
+    def update_array(self, landmarks):
+        """Count one frame of a (33, 4) landmark array, e.g. a frame of a landmark trace."""
+        if np.isnan(landmarks[0, 0]):
+            return
+        self.landmarks[:] = landmarks
+        self._step()
+
+    def _step(self):
+        counted = self.counter.update(joint_angles(self.landmarks))[0]
+        for e in np.flatnonzero(counted):
+            print(f"{REP_MESSAGES[self.counter.table.names[e]]}: {self.counter.reps[0, e]}/{self.reps}")
+
+    def count(self, name):
+        """Reps counted so far of exercise name; 0 for an exercise not in the choice."""
+        names = self.counter.table.names
+        return int(self.counter.reps[0, names.index(name)]) if name in names else 0
+
+    @property
+    def reps_right(self):
+        return self.count("right_curls")
+
+    @property
+    def reps_left(self):
+        return self.count("left_curls")
+
+    @property
+    def reps_squats(self):
+        return self.count("squats")
+
+    def lines(self):
+        if self.choice == 1:
+            return [f"Right Reps: {self.reps_right}/{self.reps}"]
+        if self.choice == 2:
+            return [f"Left Reps: {self.reps_left}/{self.reps}"]
+        if self.choice == 3:
+            return [f"Right Reps: {self.reps_right}/{self.reps}", f"Left Reps: {self.reps_left}/{self.reps}"]
+        return [f"Squats: {self.reps_squats}/{self.reps}"]
+
+    def text(self):
+        return ", ".join(self.lines())
+
+    def complete(self):
+        if self.choice == 1:
+            return self.reps_right == self.reps
+        if self.choice == 2:
+            return self.reps_left == self.reps
+        if self.choice == 3:
+            return self.reps_right == self.reps and self.reps_left == self.reps
+        return self.reps_squats == self.reps
+
+    def completion_message(self):
+        return {1: "Right arm curls completed!", 2: "Left arm curls completed!", 3: "Both arms curls completed!",
+                4: "Squats completed!"}[self.choice]
+
+
+def count_video(path, exercise_names, pose, landmark_filter=None, **source_options):
+    """Count reps in a video file with a counting-only stream; returns {exercise: reps}.
+
+    source_options (start, end, stride, percent) select the frames as for
+    frame_source.FrameSource, which decodes them ahead of inference.
+    """
+    counter = RepCounter(exercise_names)
+    with FrameSource(path, **source_options) as source:
+        frames = infer(from_source(source), pose)
+        if landmark_filter is not None:
+            frames = smooth(frames, landmark_filter)
+        sink(count(frames, counter))
+    return dict(zip(counter.table.names, counter.reps[0].tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count reps in video files without drawing anything.")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--choice", type=int, choices=[1, 2, 3, 4], default=1,
+                        help="1: right arm curls, 2: left arm curls, 3: both arms curls, 4: squats")
+    parser.add_argument("--start", type=float, default=0.0, help="Start time in seconds")
+    parser.add_argument("--end", type=float, default=None, help="End time in seconds (default: end of the video)")
+    parser.add_argument("--stride", type=int, default=1, help="Count on every Nth frame only")
+    parser.add_argument("--smooth", action="store_true",
+                        help="Smooth the landmarks over time so jitter near a threshold cannot double count")
+    args = parser.parse_args()
+
+    import mediapipe as mp
+    for path in args.videos:
+        pose = mp.solutions.pose.Pose()
+        landmark_filter = LandmarkFilter() if args.smooth else None
+        reps = count_video(path, CHOICES[args.choice], pose, landmark_filter, start=args.start, end=args.end,
+                           stride=args.stride)
+        print(f"{path}: {reps}")
+        pose.close()
+
+
+if __name__ == "__main__":
+    main()
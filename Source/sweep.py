@@ -0,0 +1,232 @@
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+from exercises import EXERCISES
+from kinematics import JOINT_NAMES, joint_angles
+from landmark_trace import load_trace
+from regression import find_traces, load_annotations, match_reps
+
+# Upper bound on the (frames, settings) elements of one vectorized step, to keep memory flat for long traces
+MAX_ELEMENTS = 1 << 24
+
+
+def threshold_grid(exercise, span=30.0, step=5.0, min_hysteresis=10.0):
+    """Every combination of phase thresholds within span degrees of the exercise's own, in steps.
+
+    Returns a (settings, phases) array in the order of exercise.phases,
+    without the settings whose "above" threshold is less than min_hysteresis
+    degrees over a "below" one, where a noisy angle could flip between phases.
+    """
+    current = [threshold for _, threshold in exercise.phases.values()]
+    axes = [np.arange(max(value - span, 0.0), min(value + span, 180.0) + step / 2, step) for value in current]
+    grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(current))
+    return grid[valid_settings(exercise, grid, min_hysteresis)]
+
+
+def random_thresholds(exercise, samples, span=30.0, min_hysteresis=10.0, seed=0):
+    """samples random settings of the phase thresholds within span degrees of the exercise's own."""
+    rng = np.random.default_rng(seed)
+    current = np.array([threshold for _, threshold in exercise.phases.values()])
+    low, high = np.maximum(current - span, 0.0), np.minimum(current + span, 180.0)
+    settings = np.empty((0, len(current)))
+    while len(settings) < samples:
+        candidates = np.round(rng.uniform(low, high, size=(samples * 2, len(current))), 1)
+        settings = np.concatenate([settings, candidates[valid_settings(exercise, candidates, min_hysteresis)]])
+    return settings[:samples]
+
+
+def valid_settings(exercise, settings, min_hysteresis):
+    below = [direction == "below" for direction, _ in exercise.phases.values()]
+    valid = np.ones(len(settings), dtype=bool)
+    for b in np.flatnonzero(below):
+        for a in np.flatnonzero(np.logical_not(below)):
+            valid &= settings[:, a] - settings[:, b] >= min_hysteresis
+    return valid
+
+
+def hysteresis(exercise, settings):
+    """Degrees between the lowest "above" and the highest "below" threshold of each setting."""
+    below = np.array([direction == "below" for direction, _ in exercise.phases.values()])
+    if below.all() or not below.any():
+        return np.full(len(settings), np.nan)
+    return settings[:, ~below].min(axis=1) - settings[:, below].max(axis=1)
+
+
+def count_settings(angles, exercise, settings):
+    """The reps counted on each frame under each setting of the phase thresholds.
+
+    angles is (frames, joints) for the exercise's joints and settings is
+    (settings, phases). Runs the state machine of Exercise.step for all
+    settings at once, vectorized over frames as exercises.count_reps is;
+    returns a (frames, settings) bool array.
+    """
+    phases = exercise.phase_names()
+    start = phases.index(exercise.start_phase)
+    count_phase = phases.index(exercise.count_phase)
+
+    # Every joint is below a threshold when the highest one is, and above it when the lowest one is; a NaN
+    # angle compares false either way, so a frame without a pose enters no phase, as in Exercise.step
+    highest, lowest = angles.max(axis=1)[:, None], angles.min(axis=1)[:, None]
+    entered = np.full((len(angles), len(settings)), -1, dtype=np.int8)
+    for p in reversed(range(len(phases))):  # Earlier phases win, like the if/elif chain of Exercise.step
+        direction, _ = exercise.phases[phases[p]]
+        passed = highest < settings[:, p] if direction == "below" else lowest > settings[:, p]
+        entered[passed] = p
+
+    # A frame that enters no phase keeps the last one entered
+    frames = np.arange(len(entered), dtype=np.int32)[:, None]
+    last = np.maximum.accumulate(np.where(entered >= 0, frames, -1), axis=0)
+    phase = np.where(last >= 0, np.take_along_axis(entered, np.maximum(last, 0), axis=0), start)
+    previous = np.concatenate([np.full((1, phase.shape[1]), start), phase[:-1]])
+    return (phase != previous) & (phase == count_phase)
+
+
+def evaluate_trace(task):
+    """Score every setting on one annotated trace and exercise; runs in a worker process.
+
+    Returns (path, exercise, camera, expected reps, counted reps per setting,
+    summed absolute timing error per setting, matched reps per setting).
+    """
+    path, name, settings, tolerance = task
+    annotations = load_annotations(path)
+    expected = annotations["reps"][name]
+    exercise = EXERCISES[name]
+    trace = load_trace(path)
+    timestamps = np.asarray(trace["timestamp"])
+    angles = joint_angles(np.asarray(trace["landmarks"]))[:, [JOINT_NAMES.index(j) for j in exercise.joints]]
+
+    counts = np.zeros(len(settings), dtype=np.int32)
+    timing_error = np.zeros(len(settings))
+    matched = np.zeros(len(settings), dtype=np.int32)
+    chunk = max(MAX_ELEMENTS // max(len(angles), 1), 1)
+    for first in range(0, len(settings), chunk):
+        counted = count_settings(angles, exercise, settings[first:first + chunk])
+        counts[first:first + chunk] = counted.sum(axis=0)
+        setting_index, frame_index = np.nonzero(counted.T)  # Grouped by setting, frames in order
+        for s, start in zip(*np.unique(setting_index, return_index=True)):
+            errors = match_reps(expected, timestamps[frame_index[start:start + counts[first + s]]].tolist(),
+                                tolerance)
+            timing_error[first + s] = sum(map(abs, errors))
+            matched[first + s] = len(errors)
+    return path, name, annotations.get("camera", "unspecified"), len(expected), counts, timing_error, matched
+
+
+def describe(exercise, settings, scores, i):
+    """One setting with its thresholds by phase name and its scores over the traces."""
+    exact, count_error, timing_error, matched, traces = scores
+    gap = hysteresis(exercise, settings[i:i + 1])[0]
+    return {
+        "thresholds": dict(zip(exercise.phase_names(), settings[i].tolist())),
+        "hysteresis": None if np.isnan(gap) else float(gap),
+        "count_accuracy": float(exact[i] / traces),
+        "count_error": int(count_error[i]),
+        "mean_abs_timing_error_s": float(timing_error[i] / matched[i]) if matched[i] else None,
+    }
+
+
+def rank(exercise, settings, scores, top=5):
+    """The top settings of one exercise and camera angle: most exact traces, fewest miscounted reps, best timing."""
+    exact, count_error, timing_error, matched, traces = scores
+    mean_timing = np.where(matched > 0, timing_error / np.maximum(matched, 1), np.inf)
+    gaps = np.nan_to_num(hysteresis(exercise, settings))
+    order = np.lexsort((-gaps, mean_timing, count_error, -exact))  # Ties go to the wider, noise-proof hysteresis
+
+    # How far each threshold can move and still count as well as the best, i.e. the margin of the best setting
+    tied = (exact == exact[order[0]]) & (count_error == count_error[order[0]])
+    return {
+        "traces": int(traces),
+        "settings": len(settings),
+        "best": [describe(exercise, settings, scores, i) for i in order[:top]],
+        "equally_accurate": {phase: [float(settings[tied, p].min()), float(settings[tied, p].max())]
+                             for p, phase in enumerate(exercise.phase_names())},
+    }
+
+
+def run_sweep(paths, exercise_names=None, search="grid", samples=1000, span=30.0, step=5.0,
+              min_hysteresis=10.0, tolerance=1.0, workers=None, top=5, seed=0):
+    """Sweep the phase thresholds of each exercise over the annotated traces; returns results per exercise and camera."""
+    traces = find_traces(paths)
+    settings = {}
+    tasks = []
+    for path in traces:
+        for name in load_annotations(path)["reps"]:
+            if exercise_names and name not in exercise_names:
+                continue
+            if name not in settings:
+                exercise = EXERCISES[name]
+                settings[name] = (random_thresholds(exercise, samples, span, min_hysteresis, seed)
+                                  if search == "random" else threshold_grid(exercise, span, step, min_hysteresis))
+                # Score the current thresholds too, to compare against
+                current = np.array([[threshold for _, threshold in exercise.phases.values()]])
+                settings[name] = np.unique(np.concatenate([current, settings[name]]), axis=0)
+            tasks.append((path, name, settings[name], tolerance))
+
+    groups = {}
+    with multiprocessing.Pool(workers) as pool:
+        for path, name, camera, expected, counts, timing_error, matched in pool.imap_unordered(evaluate_trace, tasks):
+            scores = groups.setdefault((name, camera), [0, 0, 0.0, 0, 0])
+            scores[0] = scores[0] + (counts == expected)
+            scores[1] = scores[1] + np.abs(counts - expected)
+            scores[2] = scores[2] + timing_error
+            scores[3] = scores[3] + matched
+            scores[4] += 1
+
+    results = {}
+    for (name, camera), scores in sorted(groups.items()):
+        exercise = EXERCISES[name]
+        result = rank(exercise, settings[name], scores, top)
+        current = [threshold for _, threshold in exercise.phases.values()]
+        i = int(np.flatnonzero((settings[name] == current).all(axis=1))[0])
+        result["current"] = describe(exercise, settings[name], scores, i)
+        results.setdefault(name, {})[camera] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Search the phase thresholds of the exercises for the best counts on annotated traces.")
+    parser.add_argument("paths", nargs="+", help="Annotated trace files or directories (see regression.py)")
+    parser.add_argument("--exercise", action="append", choices=sorted(EXERCISES),
+                        help="Only sweep this exercise (repeatable; default: every annotated one)")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--samples", type=int, default=1000, help="Settings tried per exercise by --search random")
+    parser.add_argument("--span", type=float, default=30.0,
+                        help="Degrees around the current thresholds to search (default: 30)")
+    parser.add_argument("--step", type=float, default=5.0, help="Grid step in degrees (default: 5)")
+    parser.add_argument("--min-hysteresis", type=float, default=10.0,
+                        help="Least degrees between the thresholds of entering and leaving a phase (default: 10)")
+    parser.add_argument("--tolerance", type=float, default=1.0,
+                        help="Seconds a counted rep may be from its annotation and still match")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--top", type=int, default=5, help="Settings listed per exercise and camera angle")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_sweep(args.paths, args.exercise, args.search, args.samples, args.span, args.step,
+                        args.min_hysteresis, args.tolerance, args.workers, args.top, args.seed)
+    if not results:
+        parser.error("No annotated traces found")
+    elapsed = time.perf_counter() - start
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    for name, cameras in results.items():
+        for camera, result in cameras.items():
+            best, current = result["best"][0], result["current"]
+            print(f"{name} ({camera}): best {best['thresholds']} accuracy {best['count_accuracy']:.3f}, "
+                  f"current {current['thresholds']} accuracy {current['count_accuracy']:.3f}")
+    print(f"Swept {sum(r['settings'] for c in results.values() for r in c.values())} settings in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
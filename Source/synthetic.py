@@ -0,0 +1,128 @@
+import cv2
+import numpy as np
+
+from kinematics import NUM_LANDMARKS, PoseLandmark
+
+# Standing pose facing the camera, in normalized image coordinates. The person's
+# right side is on the left of the image, as MediaPipe reports it.
+STANDING_POSE = {
+    PoseLandmark.NOSE: (0.50, 0.14),
+    PoseLandmark.LEFT_SHOULDER: (0.58, 0.28),
+    PoseLandmark.RIGHT_SHOULDER: (0.42, 0.28),
+    PoseLandmark.LEFT_HIP: (0.555, 0.55),
+    PoseLandmark.RIGHT_HIP: (0.445, 0.55),
+    PoseLandmark.LEFT_ANKLE: (0.56, 0.95),
+    PoseLandmark.RIGHT_ANKLE: (0.44, 0.95),
+}
+UPPER_ARM = 0.12
+FOREARM = 0.11
+THIGH = 0.20
+SHIN = 0.20
+
+# (joint, lowest angle, highest angle) of one rep for each menu choice
+MOTIONS = {
+    1: [("right_elbow", 30.0, 175.0)],
+    2: [("left_elbow", 30.0, 175.0)],
+    3: [("right_elbow", 30.0, 175.0), ("left_elbow", 30.0, 175.0)],
+    4: [("right_knee", 80.0, 175.0), ("left_knee", 80.0, 175.0)],
+}
+
+SKELETON = [
+    (PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER),
+    (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_ELBOW), (PoseLandmark.LEFT_ELBOW, PoseLandmark.LEFT_WRIST),
+    (PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_ELBOW), (PoseLandmark.RIGHT_ELBOW, PoseLandmark.RIGHT_WRIST),
+    (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_HIP), (PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_HIP),
+    (PoseLandmark.LEFT_HIP, PoseLandmark.RIGHT_HIP),
+    (PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_KNEE), (PoseLandmark.LEFT_KNEE, PoseLandmark.LEFT_ANKLE),
+    (PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_KNEE), (PoseLandmark.RIGHT_KNEE, PoseLandmark.RIGHT_ANKLE),
+]
+
+
+def pose_landmarks(right_elbow=175.0, left_elbow=175.0, right_knee=175.0, left_knee=175.0):
+    """Return a (33, 4) landmark array of the standing pose with the given joint angles, in degrees."""
+    landmarks = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+    landmarks[:, 3] = 0.99
+    for index, (x, y) in STANDING_POSE.items():
+        landmarks[index, :2] = (x, y)
+
+    # Legs: ankles stay on the floor, the shin stays vertical and the thigh folds at the knee.
+    # The squat depth is set by the lower of the two knees, so the upper body stays level.
+    drop = 0.0
+    for knee, hip, ankle, angle, side in [
+        (PoseLandmark.RIGHT_KNEE, PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_ANKLE, right_knee, -1),
+        (PoseLandmark.LEFT_KNEE, PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_ANKLE, left_knee, 1),
+    ]:
+        radians = np.radians(angle)
+        landmarks[knee, :2] = landmarks[ankle, :2] - (0, SHIN)
+        landmarks[hip, :2] = landmarks[knee, :2] + THIGH * np.array([side * np.sin(radians), np.cos(radians)])
+        drop = max(drop, landmarks[hip, 1] - STANDING_POSE[hip][1])
+    for index in (PoseLandmark.NOSE, PoseLandmark.LEFT_SHOULDER, PoseLandmark.RIGHT_SHOULDER):
+        landmarks[index, 1] += drop
+
+    # Arms: the upper arm hangs down and the forearm turns about the elbow
+    for shoulder, elbow, wrist, angle, side in [
+        (PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_ELBOW, PoseLandmark.RIGHT_WRIST, right_elbow, -1),
+        (PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_ELBOW, PoseLandmark.LEFT_WRIST, left_elbow, 1),
+    ]:
+        radians = np.radians(angle)
+        landmarks[elbow, :2] = landmarks[shoulder, :2] + (0, UPPER_ARM)
+        landmarks[wrist, :2] = landmarks[elbow, :2] + FOREARM * np.array([side * np.sin(radians), -np.cos(radians)])
+
+    # The remaining landmarks (face, hands, feet) sit on their nearest tracked joint
+    for index in range(NUM_LANDMARKS):
+        if index <= PoseLandmark.MOUTH_RIGHT:
+            landmarks[index, :2] = landmarks[PoseLandmark.NOSE, :2]
+        elif index in (PoseLandmark.LEFT_PINKY, PoseLandmark.LEFT_INDEX, PoseLandmark.LEFT_THUMB):
+            landmarks[index, :2] = landmarks[PoseLandmark.LEFT_WRIST, :2]
+        elif index in (PoseLandmark.RIGHT_PINKY, PoseLandmark.RIGHT_INDEX, PoseLandmark.RIGHT_THUMB):
+            landmarks[index, :2] = landmarks[PoseLandmark.RIGHT_WRIST, :2]
+        elif index in (PoseLandmark.LEFT_HEEL, PoseLandmark.LEFT_FOOT_INDEX):
+            landmarks[index, :2] = landmarks[PoseLandmark.LEFT_ANKLE, :2]
+        elif index in (PoseLandmark.RIGHT_HEEL, PoseLandmark.RIGHT_FOOT_INDEX):
+            landmarks[index, :2] = landmarks[PoseLandmark.RIGHT_ANKLE, :2]
+    return landmarks
+
+
+def synthetic_trace(choice, reps=10, fps=30.0, period=2.0, noise=0.002, seed=0):
+    """Generate a landmark trace of `reps` reps of exercise choice 1-4.
+
+    Each rep starts at the highest angle, reaches the lowest angle halfway
+    through the period and comes back up. Returns (landmarks, timestamps,
+    rep_times), where rep_times are the ground-truth times of the lowest points
+    and landmarks get Gaussian noise of standard deviation `noise`.
+    """
+    frames = int(round(reps * period * fps)) + 1
+    timestamps = np.arange(frames) / fps
+    phase = np.cos(2 * np.pi * timestamps / period)  # 1 at the top of each rep, -1 at the bottom
+
+    landmarks = np.empty((frames, NUM_LANDMARKS, 4), dtype=np.float32)
+    for frame in range(frames):
+        angles = {}
+        for joint, low, high in MOTIONS[choice]:
+            angles[joint] = (high + low) / 2 + (high - low) / 2 * phase[frame]
+        landmarks[frame] = pose_landmarks(**angles)
+
+    rng = np.random.default_rng(seed)
+    landmarks[:, :, :2] += rng.normal(0, noise, size=(frames, NUM_LANDMARKS, 2)).astype(np.float32)
+    rep_times = (np.arange(reps) + 0.5) * period
+    return landmarks, timestamps, rep_times
+
+
+def draw_skeleton(landmarks, width=640, height=480):
+    """Render a landmark frame as a BGR stick figure."""
+    img = np.full((height, width, 3), 40, dtype=np.uint8)
+    points = (landmarks[:, :2] * (width, height)).astype(int)
+    for a, b in SKELETON:
+        cv2.line(img, tuple(points[a]), tuple(points[b]), (200, 200, 200), 6)
+    cv2.circle(img, tuple(points[PoseLandmark.NOSE]), int(0.05 * height), (200, 200, 200), -1)
+    return img
+
+
+def write_synthetic_video(path, landmarks, fps=30.0, width=640, height=480):
+    """Write a trace as a stick-figure video, so decode and inference can be timed without a camera."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    if not writer.isOpened():
+        raise IOError(f"Could not write video file {path}")
+    for frame in landmarks:
+        writer.write(draw_skeleton(frame, width, height))
+    writer.release()
@@ -0,0 +1,203 @@
+"""Equivalence of the rep counting engines, the vectorized angles and the frame skipper, on synthetic traces."""
+
+import math
+
+import numpy as np
+import pytest
+
+from exercises import CHOICES, EXERCISES, RepCounter, count_reps
+from frame_skip import FrameSkipper
+from kinematics import JOINT_NAMES, JOINTS, calculate_angle, joint_angles, landmark_array
+from landmark_trace import ReplayResults
+from left_curls import detect_left_curls
+from right_curls import detect_right_curls
+from squats import detect_squats
+from streams import Detector
+from sweep import count_settings
+from synthetic import pose_landmarks, synthetic_trace
+
+DETECT_FUNCTIONS = {"right_curls": detect_right_curls, "left_curls": detect_left_curls, "squats": detect_squats}
+
+
+# A short clean and a noisy trace of every exercise choice
+NOISES = (0.002, 0.01)
+TRACES = [(choice, synthetic_trace(choice, reps=4, period=1.5, noise=noise, seed=seed))
+          for choice in CHOICES for seed, noise in enumerate(NOISES)]
+TRACE_IDS = [f"choice{choice}-noise{noise:g}" for choice in CHOICES for noise in NOISES]
+
+
+def curl_trace(bottoms, fps=30.0, period=1.0, top=175.0):
+    """Right curls from top down to each angle in bottoms and back up, one rep per period."""
+    frames = int(len(bottoms) * period * fps)
+    t = np.arange(frames) / fps
+    bottom = np.asarray(bottoms, dtype=float)[(t // period).astype(int)]
+    angles = bottom + (top - bottom) * (np.cos(2 * np.pi * t / period) + 1) / 2
+    return np.stack([pose_landmarks(right_elbow=angle) for angle in angles])
+
+
+@pytest.mark.parametrize("choice,trace", TRACES, ids=TRACE_IDS)
+def test_rep_counter_matches_detect_functions(choice, trace):
+    landmarks, _, rep_times = trace
+    names = CHOICES[choice]
+    counter = RepCounter(names)
+    state = {name: (0, EXERCISES[name].start_phase) for name in names}
+    for frame in landmarks:
+        counted = counter.update(joint_angles(frame))[0]
+        results = ReplayResults(frame)
+        for e, name in enumerate(names):
+            reps, phase = state[name]
+            new_reps, phase = DETECT_FUNCTIONS[name](None, results, None, reps, 0, phase)[:2]
+            assert (new_reps > reps) == counted[e]
+            state[name] = (new_reps, phase)
+            assert counter.phase_name(0, e) == phase
+    assert counter.reps[0].tolist() == [len(rep_times)] * len(names)
+
+
+@pytest.mark.parametrize("choice,trace", TRACES, ids=TRACE_IDS)
+def test_count_reps_and_detector_match_rep_counter(choice, trace):
+    landmarks = trace[0]
+    names = CHOICES[choice]
+    counter = RepCounter(names)
+    detector = Detector(choice, 0)
+    for frame in landmarks:
+        counter.update(joint_angles(frame))
+        detector.update_array(frame)
+    expected = dict(zip(names, counter.reps[0].tolist()))
+    assert count_reps(joint_angles(landmarks), names) == expected
+    assert dict(zip(names, detector.counter.reps[0].tolist())) == expected
+
+
+def test_exercise_step_holds_phase_without_angles():
+    exercise = EXERCISES["squats"]
+    assert exercise.step("down", [math.nan, 170.0]) == ("down", False)
+    assert exercise.step("down", [170.0, 165.0]) == ("up", False)
+    assert exercise.step("up", [90.0, 95.0]) == ("down", True)
+
+
+def test_joint_angles_match_calculate_angle():
+    rng = np.random.default_rng(0)
+    landmarks = np.concatenate([synthetic_trace(choice, reps=1)[0] for choice in CHOICES]
+                               + [rng.uniform(0, 1, size=(50, 33, 4)).astype(np.float32)])
+    angles = joint_angles(landmarks)
+    for f, frame in enumerate(landmarks):
+        for j, name in enumerate(JOINT_NAMES):
+            a, b, c = JOINTS[name]
+            assert angles[f, j] == pytest.approx(calculate_angle(frame[a], frame[b], frame[c]), abs=1e-4)
+    assert joint_angles(landmarks[0]) == pytest.approx(angles[0])
+
+
+@pytest.mark.parametrize("choice,trace", TRACES, ids=TRACE_IDS)
+def test_count_settings_matches_count_reps(choice, trace):
+    angles = joint_angles(trace[0])
+    for name in CHOICES[choice]:
+        exercise = EXERCISES[name]
+        columns = [JOINT_NAMES.index(joint) for joint in exercise.joints]
+        current = [threshold for _, threshold in exercise.phases.values()]
+        settings = np.array([current, [t + 10 for t in current], [t - 10 for t in current]], dtype=float)
+        counted = count_settings(angles[:, columns], exercise, settings)
+        assert counted[:, 0].sum() == count_reps(angles, [name])[name]
+
+        # Every setting counts on the same frames as a RepCounter with those thresholds
+        for s, thresholds in enumerate(settings):
+            phases = {phase: (direction, thresholds[p])
+                      for p, (phase, (direction, _)) in enumerate(exercise.phases.items())}
+            state, expected = exercise.start_phase, []
+            variant = type(exercise)(name, exercise.label, exercise.joints, phases, exercise.count_phase,
+                                     exercise.start_phase)
+            for frame_angles in angles[:, columns]:
+                state, rep = variant.step(state, frame_angles.tolist())
+                expected.append(rep)
+            assert counted[:, s].tolist() == expected
+
+
+class FakeLandmark:
+    def __init__(self, x, y, z, visibility):
+        self.x, self.y, self.z, self.visibility = x, y, z, visibility
+
+
+class FakeLandmarkList:
+    """Mutable landmarks with CopyFrom, as FrameSkipper.predict needs of MediaPipe's."""
+
+    def __init__(self, rows=()):
+        self.landmark = [FakeLandmark(*row) for row in rows]
+
+    def CopyFrom(self, other):
+        self.landmark = [FakeLandmark(lm.x, lm.y, lm.z, lm.visibility) for lm in other.landmark]
+
+
+class FakeResults:
+    def __init__(self, landmarks):
+        self.pose_landmarks = FakeLandmarkList(landmarks.tolist())
+
+
+def run_skipper(landmarks, inference_time=0.1, fps=30.0, **options):
+    """Feed a trace through a FrameSkipper as a pipeline would; returns (skipper, counter, predicted mask)."""
+    skipper = FrameSkipper(["right_curls"], **options)
+    counter = RepCounter(["right_curls"])
+    predicted = []
+    for i, frame in enumerate(landmarks):
+        timestamp = i / fps
+        skipper.observe_frame(timestamp)
+        if skipper.should_infer(timestamp):
+            results = FakeResults(frame)
+            skipper.observe(results, timestamp, inference_time)
+        else:
+            results = skipper.predict(timestamp)
+        before = counter.phase.copy()
+        counter.update(joint_angles(landmark_array(results)))
+        predicted.append(getattr(results, "predicted", False))
+        if predicted[-1]:
+            assert (counter.phase == before).all(), f"predicted frame {i} changed the stage"
+    return skipper, counter, np.array(predicted)
+
+
+def test_frame_skipper_stride_follows_inference_time():
+    skipper = run_skipper(curl_trace([30.0] * 2), inference_time=0.1)[0]
+    assert skipper.stride == math.ceil(0.1 * skipper.headroom * 30)
+    assert run_skipper(curl_trace([30.0] * 2), inference_time=1.0)[0].stride == skipper.max_stride
+    assert run_skipper(curl_trace([30.0] * 2), inference_time=0.01)[0].stride == 1
+
+
+def test_frame_skipper_counts_full_reps():
+    landmarks = curl_trace([30.0] * 5)
+    skipper, counter, predicted = run_skipper(landmarks)
+    assert predicted.any()
+    assert counter.reps[0, 0] == count_reps(joint_angles(landmarks), ["right_curls"])["right_curls"] == 5
+
+
+def test_frame_skipper_predictions_cannot_finish_partial_reps():
+    landmarks = curl_trace([45.0, 48.0, 46.0, 47.0, 45.0, 48.0])
+    assert count_reps(joint_angles(landmarks), ["right_curls"])["right_curls"] == 0
+    counter = run_skipper(landmarks)[1]
+    assert counter.reps[0, 0] == 0
+
+
+def test_frame_skipper_prediction_holds_the_stage():
+    skipper = FrameSkipper(["right_curls"])
+    for i, angle in enumerate((70.0, 50.0)):  # Curling fast towards the 40 degree threshold
+        skipper.observe_frame(i / 30)
+        skipper.observe(FakeResults(pose_landmarks(right_elbow=angle)), i / 30, 0.01)
+    elbow = JOINT_NAMES.index("right_elbow")
+    assert joint_angles(skipper.extrapolate(2 / 30))[elbow] < 40.0
+    predicted = landmark_array(skipper.predict(2 / 30))
+    assert joint_angles(predicted)[elbow] == pytest.approx(50.0, abs=0.5)
+
+
+def test_frame_skipper_infers_near_thresholds():
+    landmarks = curl_trace([30.0] * 3)
+    _, _, predicted = run_skipper(landmarks)
+    angles = joint_angles(landmarks)[:, JOINT_NAMES.index("right_elbow")]
+    near = (np.abs(angles - 40.0) < 15.0) | (np.abs(angles - 130.0) < 15.0)
+    assert not predicted[near].any()
+
+
+def test_frame_skipper_clamps_extrapolation():
+    skipper = FrameSkipper(["right_curls"], max_shift=0.05)
+    start, moved = pose_landmarks(right_elbow=175.0), pose_landmarks(right_elbow=175.0)
+    moved[:, :2] += 0.04  # Fast drift to the lower right
+    for i, landmarks in enumerate((start, moved)):
+        skipper.observe_frame(i / 30)
+        skipper.observe(FakeResults(landmarks), i / 30, 0.01)
+    predicted = skipper.extrapolate(10.0)
+    assert np.abs(predicted[:, :2] - moved[:, :2]).max() <= 0.05 + 1e-6
+